@@ -1,8 +1,13 @@
 import os
 import json
+import atexit
+import asyncio
+import logging
 import firebase_admin
 from firebase_admin import credentials, firestore
-from typing import Optional
+from typing import Optional, List, Tuple, Dict, Any
+
+logger = logging.getLogger(__name__)
 
 class FirebaseManager:
     def __init__(self):
@@ -15,20 +20,20 @@ class FirebaseManager:
             # 1. 環境変数から読み込み（優先）
             firebase_key = os.getenv("FIREBASE_SERVICE_ACCOUNT_KEY")
             if firebase_key:
-                print("INFO: Using Firebase key from environment variable")
+                logger.info("Using Firebase key from environment variable")
                 service_account_info = json.loads(firebase_key)
             else:
                 # 2. JSONファイルから読み込み
                 json_files = [f for f in os.listdir('.') if 'firebase-adminsdk' in f and f.endswith('.json')]
                 
                 if not json_files:
-                    print("WARNING: No Firebase service account key found")
+                    logger.warning("No Firebase service account key found")
                     self.db = None
                     return
                 
                 # 最初に見つかったファイルを使用
                 key_file = json_files[0]
-                print(f"INFO: Using Firebase key from file: {key_file}")
+                logger.info(f"Using Firebase key from file: {key_file}")
                 
                 with open(key_file, 'r', encoding='utf-8') as f:
                     service_account_info = json.load(f)
@@ -40,11 +45,11 @@ class FirebaseManager:
             
             # Firestore クライアントを取得
             self.db = firestore.client()
-            print("SUCCESS: Firebase initialized successfully")
+            logger.info("Firebase initialized successfully")
             
         except Exception as e:
-            print(f"ERROR: Firebase initialization error: {e}")
-            print("WARNING: Continuing without Firebase features")
+            logger.error(f"Firebase initialization error: {e}")
+            logger.warning("Continuing without Firebase features")
             self.db = None
     
     def get_db(self) -> Optional[firestore.Client]:
@@ -55,5 +60,74 @@ class FirebaseManager:
         """Firebaseが利用可能かチェック"""
         return self.db is not None
 
+class FirestoreBatchWriter:
+    """ログ系の追記書き込みをまとめてWriteBatchでコミットする"""
+    
+    MAX_BATCH_SIZE = 100  # WriteBatchの上限は500件
+    FLUSH_INTERVAL = 0.5  # 秒
+    
+    def __init__(self, manager: FirebaseManager):
+        self.manager = manager
+        self._pending: List[Tuple[Any, Dict[str, Any]]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+    
+    def add(self, collection: str, data: Dict[str, Any]) -> bool:
+        """collection.add() の代わりに書き込みをキューへ積む"""
+        db = self.manager.get_db()
+        if not db:
+            return False
+        
+        # 自動IDのドキュメント参照（collection.add と同じ挙動）
+        self._pending.append((db.collection(collection).document(), data))
+        
+        if len(self._pending) >= self.MAX_BATCH_SIZE:
+            self.flush()
+        elif self._flush_handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # イベントループ外ではその場で書き込む
+                self.flush()
+                return True
+            self._flush_handle = loop.call_later(self.FLUSH_INTERVAL, self.flush)
+        return True
+    
+    def flush(self):
+        """キューに溜まった書き込みを1回のコミットで反映"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        if not self._pending:
+            return
+        
+        pending, self._pending = self._pending, []
+        try:
+            batch = self.manager.get_db().batch()
+            for doc_ref, data in pending:
+                batch.set(doc_ref, data)
+        except Exception as e:
+            logger.error(f"Firestore batch build failed ({len(pending)} writes): {e}")
+            return
+        
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 終了時などイベントループ外ではその場でコミット
+            self._commit(batch, len(pending))
+            return
+        # コミットは同期通信なのでイベントループを止めないようスレッドで実行
+        loop.run_in_executor(None, self._commit, batch, len(pending))
+    
+    @staticmethod
+    def _commit(batch, count: int):
+        """WriteBatchをコミット（失敗はログのみ）"""
+        try:
+            batch.commit()
+        except Exception as e:
+            logger.error(f"Firestore batch commit failed ({count} writes): {e}")
+
 # グローバルインスタンス
 firebase_manager = FirebaseManager()
+firestore_batch_writer = FirestoreBatchWriter(firebase_manager)
+atexit.register(firestore_batch_writer.flush)
@@ -3,22 +3,214 @@
 """
 import logging
 import json
+import re
 import asyncio
-from typing import Dict, Any, Optional, List
-import openai
-from openai import AsyncOpenAI
+import copy
+import time
+import unicodedata
+from sys import intern
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Callable, Awaitable
+from src.openai_client import openai_client, openai_rate_limiter
 import os
 from datetime import datetime, timedelta
 import pytz
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# 東京タイムゾーン（呼び出しごとに引かない）
+JST = pytz.timezone('Asia/Tokyo')
+
+# 意図理解結果キャッシュ（相対日時を含むため短めのTTL）
+INTENT_CACHE_SIZE = 2048
+INTENT_CACHE_TTL = 300
+
+
+# 意図キャッシュのキー正規化用（表記ゆれだけの発言を同じキーにまとめる）
+_CACHE_KEY_WHITESPACE = re.compile(r'\s+')
+_CACHE_KEY_TRAILING = '!?。.、,~ '
+
+
+def _intent_cache_key(text: str) -> str:
+    """全角半角・空白・末尾の記号・大文字小文字の違いを吸収したキャッシュキー"""
+    normalized = unicodedata.normalize('NFKC', text)
+    return _CACHE_KEY_WHITESPACE.sub(' ', normalized).strip().rstrip(_CACHE_KEY_TRAILING).lower()
+
+
+# モデルが付けることのある ```json フェンス
+_CODE_FENCE_PATTERN = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+
+
+def _loads_json(content: str) -> Dict[str, Any]:
+    """JSONモードの応答をパース（orjsonがあれば高速パス）"""
+    if content.lstrip().startswith('```'):
+        content = _CODE_FENCE_PATTERN.sub('', content)
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _dumps_compact(obj: Any) -> str:
+    """
+    プロンプト埋め込み用のコンパクトなJSON（日時などJSON非対応の値は文字列化）
+    
+    キーを並べ替えて同じ内容なら常に同じバイト列にする（プロンプトキャッシュの前方一致を崩さない）
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS).decode()
+        except orjson.JSONEncodeError:
+            pass  # 64bitを超える整数などは標準ライブラリに任せる
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), sort_keys=True, default=str)
+
+
+# 意図理解の応答スキーマ（actionを既知のものに限定する）
+_INTENT_RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {
+            "type": "string",
+            "enum": [
+                "create", "list", "complete", "delete", "update", "priority", "remind",
+                "gmail_check", "gmail_search", "tasks_create", "tasks_list",
+                "docs_create", "sheets_create", "drive_create_folder",
+                "calendar_create_event", "custom_reminder", "chat"
+            ]
+        },
+        "confidence": {"type": "number"},
+        "parameters": {"type": "object"},
+        "reasoning": {"type": "string"},
+        "reply": {"type": "string"}
+    },
+    "required": ["action", "confidence", "parameters", "reasoning"]
+}
+
+_INTENT_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "intent_result",
+        "strict": False,
+        "schema": _INTENT_RESULT_SCHEMA
+    }
+}
+
+# 複数発言を1リクエストで分類するときの応答スキーマ（各結果にidxを付けて返させる）
+_INTENT_BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "intent_results",
+        "strict": False,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"idx": {"type": "integer"}, **_INTENT_RESULT_SCHEMA["properties"]},
+                        "required": ["idx", *_INTENT_RESULT_SCHEMA["required"]]
+                    }
+                }
+            },
+            "required": ["results"]
+        }
+    }
+}
+
+_INTENT_BATCH_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "今回は複数の発言が {\"turns\": [{\"idx\": 番号, \"text\": 発言}, ...]} の形で渡されます。"
+        "各発言を独立に分析し、{\"results\": [{\"idx\": 発言の番号, \"action\": ..., ...}, ...]} "
+        "の形で全ての発言の結果を返してください。"
+    )
+}
+
+# 1リクエストにまとめる発言数の上限
+INTENT_BATCH_SIZE = 10
+
+# モデルが相対表現（1時間後・明日など）を絶対日時に直して返すパラメータ（問い合わせ時点に固定されるのでキャッシュしない）
+_TIME_PARAMETER_KEYS = ('remind_time', 'due_date', 'start_time', 'end_time')
+
+# LLMに問い合わせるまでもない挨拶・相槌（末尾の記号を除いて小文字化した本文と完全一致で引く）
+_TRIVIAL_CHAT_WORDS = frozenset([
+    'おはよう', 'こんにちは', 'こんばんは', 'よう', 'やあ', '了解', 'りょうかい',
+    'ok', 'okay', 'うん', 'はい', 'ありがとう', 'hi', 'hello'
+])
+_TRIVIAL_CHAT_TRAILING = '!！。.〜ー~ \t\r\n\u3000'
+
+# 返答生成の魔女風システムメッセージ（毎回同じ内容なのでプロンプトキャッシュが効く）
+_RESPONSE_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": """あなたは荒れ地の魔女のような品のあるおばあさんの性格を持つCatherine AIです。
+以下の特徴で返答してください:
+- 「ふふ、○○だね」「やれやれ、○○だよ」のような話し方
+- 「あらあら」「おやおや」「まったく」などの口癖
+- 品があって少し意地悪だけど優しい
+- ユーザーのことを気にかけている
+
+実行結果に基づいて、自然で魔女らしい返答を生成してください。
+成功の場合は満足そうに、失敗の場合は心配そうに返答してください。"""
+}
+
+# 返答生成プロンプトの固定部分（可変部分だけを連結する）
+_RESPONSE_INTENT_PREFIX = "\n意図理解結果: "
+_RESPONSE_EXECUTION_PREFIX = "\n実行結果: "
+_RESPONSE_SUFFIX = "\n\n\n適切な返答を生成してください。"
+_USER_INFO_PREFIX = "ユーザー情報: "
+
+
+# 現在時刻ヘッダーのキャッシュ [エポック秒, 文字列]
+_time_context_cache = [0, ""]
+
+_WEEKDAY_NAMES = ['月', '火', '水', '木', '金', '土', '日']
+
+
+def _time_context(now_jst: datetime) -> str:
+    """現在時刻・曜日のコンテキスト文字列（同じ秒内は使い回す）"""
+    second = int(now_jst.timestamp())
+    if _time_context_cache[0] != second:
+        _time_context_cache[0] = second
+        _time_context_cache[1] = f"""
+現在時刻: {now_jst.strftime('%Y-%m-%d %H:%M:%S')} (JST)
+曜日: {_WEEKDAY_NAMES[now_jst.weekday()]}曜日
+"""
+    return _time_context_cache[1]
+
+
+def _trivial_intent(text: str) -> Optional[Dict[str, Any]]:
+    """明らかな一般会話ならNLU結果を直接返す（判定できなければNone）"""
+    if text.strip().rstrip(_TRIVIAL_CHAT_TRAILING).lower() in _TRIVIAL_CHAT_WORDS:
+        return {
+            "action": "chat",
+            "confidence": 0.9,
+            "parameters": {"message": text},
+            "reasoning": "定型の挨拶・相槌"
+        }
+    return None
+
 class AdvancedNLU:
     """ChatGPT APIを使った高度な自然言語理解システム"""
     
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        # 接続プールを共有するクライアント（HTTP/2が使えれば多重化）
+        self.client = openai_client
         self.model = os.getenv('DEFAULT_MODEL', 'gpt-5-mini')
+        # 意図分類はJSONを返すだけなので軽量モデルで十分（応答生成はDEFAULT_MODEL）
+        self.intent_model = os.getenv('NLU_MODEL', 'gpt-5-nano')
+        # 実行結果の報告は結果を言い換えるだけなので軽量モデル（雑談の返答はDEFAULT_MODEL）
+        self.action_response_model = os.getenv('ACTION_RESPONSE_MODEL', 'gpt-5-nano')
+        # 同時に投げるAPIリクエスト数の上限（バースト時のレート制限対策）
+        self._request_semaphore = asyncio.Semaphore(int(os.getenv('NLU_MAX_CONCURRENCY', '10')))
+        # 正規化テキスト -> (モデルの生の結果, 保存時刻)
+        self._intent_cache: OrderedDict = OrderedDict()
+        self._intent_cache_hits = 0
+        self._intent_cache_misses = 0
         
         # システムプロンプト
         self.system_prompt = """あなたはCatherine AIの自然言語理解エンジンです。
@@ -49,7 +241,10 @@ class AdvancedNLU:
    - custom_reminder: カスタムメッセージリマインダー (text, mention_target, channel_target)
 
 4. **一般会話**:
-   - chat: 通常の会話・質問回答
+   - chat: 通常の会話・質問回答（この場合のみ reply に返答文を入れる）
+
+chatの返答文(reply)は荒れ地の魔女のような品のあるおばあさんの口調で書いてください
+（「ふふ、○○だね」「やれやれ」「あらあら」などの口癖、少し意地悪だけど優しい）。
 
 優先度レベル: urgent(激高), high(高), normal(普通), low(低)
 
@@ -59,12 +254,13 @@ class AdvancedNLU:
 - "1時間後" -> 現在時刻から1時間後
 - "来週の月曜" -> 来週の月曜日
 
-レスポンス形式(JSON):
+レスポンス形式(JSON): 必ず有効なJSONオブジェクトのみで返答してください。
 {
   "action": "アクション名",
   "confidence": 0.0-1.0の信頼度,
   "parameters": {パラメータ辞書},
-  "reasoning": "判断理由の簡単な説明"
+  "reasoning": "判断理由の簡単な説明",
+  "reply": "actionがchatの場合のみ、ユーザーへの返答文"
 }
 
 例:
@@ -74,15 +270,15 @@ class AdvancedNLU:
 入力: "メールを3通確認して"
 出力: {"action": "gmail_check", "confidence": 0.9, "parameters": {"count_limit": 3}, "reasoning": "Gmail確認、3通の制限指定"}
 
-入力: "おはよう"
-出力: {"action": "chat", "confidence": 0.8, "parameters": {"message": "おはよう"}, "reasoning": "一般的な挨拶"}
-
 入力: "1時間後にミーティング準備をリマインド@everyone"
 出力: {"action": "custom_reminder", "confidence": 0.9, "parameters": {"text": "1時間後にミーティング準備をリマインド@everyone"}, "reasoning": "カスタムリマインダー設定"}
 
 入力: "3番のTODOを明日の10時にリマインド"
 出力: {"action": "remind", "confidence": 0.9, "parameters": {"todo_number": 3, "remind_time": "2025-08-26T10:00:00+09:00", "mention_target": "everyone", "channel_target": "catherine"}, "reasoning": "TODO項目リマインダー設定"}
 """
+        
+        # 送信ごとに作り直さない固定のシステムメッセージ
+        self._system_message = {"role": "system", "content": self.system_prompt}
 
     async def understand_intent(self, text: str, user_context: Optional[Dict] = None) -> Dict[str, Any]:
         """
@@ -95,34 +291,43 @@ class AdvancedNLU:
         Returns:
             意図とパラメータを含む辞書
         """
+        # 挨拶・相槌はAPIを呼ばずに処理
+        trivial = _trivial_intent(text)
+        if trivial:
+            return trivial
+        
         try:
             # 現在時刻を東京時間で取得
-            now_jst = datetime.now(pytz.timezone('Asia/Tokyo'))
+            now_jst = datetime.now(JST)
             
-            # コンテキスト情報を構築
-            context_info = f"""
-現在時刻: {now_jst.strftime('%Y-%m-%d %H:%M:%S')} (JST)
-曜日: {['月', '火', '水', '木', '金', '土', '日'][now_jst.weekday()]}曜日
-"""
-            
-            if user_context:
-                context_info += f"ユーザー情報: {json.dumps(user_context, ensure_ascii=False, indent=2)}\n"
-            
-            # ChatGPT APIに送信
-            messages = [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "system", "content": context_info},
-                {"role": "user", "content": f"次の発言を分析してください: 「{text}」"}
-            ]
+            # 正規化した本文をそのままキーにする（文字列のハッシュはdictが持っている）
+            cache_key = _intent_cache_key(text)
+            result = self._get_cached_intent(cache_key)
             
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_completion_tokens=1000,
-                response_format={"type": "json_object"}
-            )
-            
-            result = json.loads(response.choices[0].message.content)
+            if result is None:
+                # コンテキスト情報を構築（キャッシュヒット時は文脈のシリアライズ自体を省く）
+                context_info = _time_context(now_jst)
+                if user_context:
+                    context_info += _USER_INFO_PREFIX + _dumps_compact(user_context) + "\n"
+                
+                # ChatGPT APIに送信
+                messages = [
+                    self._system_message,
+                    {"role": "system", "content": context_info},
+                    {"role": "user", "content": text}
+                ]
+                
+                async with self._request_semaphore:
+                    await openai_rate_limiter.acquire()
+                    response = await self.client.chat.completions.create(
+                        model=self.intent_model,
+                        messages=messages,
+                        max_completion_tokens=1000,
+                        response_format=_INTENT_RESPONSE_FORMAT
+                    )
+                
+                result = _loads_json(response.choices[0].message.content)
+                self._store_model_intent(cache_key, result)
             
             # 結果の後処理
             result = await self._post_process_result(result, text, now_jst)
@@ -140,6 +345,135 @@ class AdvancedNLU:
                 "reasoning": f"NLU処理でエラーが発生: {str(e)}"
             }
 
+    async def understand_intents(self, texts: List[str], user_context: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """
+        複数の発言をまとめて意図理解（同じ発言は1回だけ処理し、未知の発言は1リクエストにまとめて問い合わせる）
+        
+        Args:
+            texts: ユーザーの発言のリスト
+            user_context: 全発言に共通の文脈情報
+            
+        Returns:
+            textsと同じ順序の意図理解結果のリスト
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        # APIに問い合わせる必要のある発言だけをまとめて1リクエストで分類する
+        pending = [
+            text for text in unique_texts
+            if not _trivial_intent(text) and _intent_cache_key(text) not in self._intent_cache
+        ]
+        classified: Dict[str, Dict[str, Any]] = {}
+        if len(pending) > 1:
+            batches = [pending[i:i + INTENT_BATCH_SIZE] for i in range(0, len(pending), INTENT_BATCH_SIZE)]
+            for batch_results in await asyncio.gather(*(self._classify_batch(batch, user_context) for batch in batches)):
+                classified.update(batch_results)
+        
+        now_jst = datetime.now(JST)
+        
+        async def understand(text: str) -> Dict[str, Any]:
+            # まとめて分類できた発言は後処理だけ、それ以外は個別に処理（同時実行数は_request_semaphoreで抑えられる）
+            if text in classified:
+                return await self._post_process_result(classified[text], text, now_jst)
+            return await self.understand_intent(text, user_context)
+        
+        results = await asyncio.gather(*(understand(text) for text in unique_texts))
+        by_text = dict(zip(unique_texts, results))
+        
+        # 重複した発言には独立したコピーを返す（呼び出し側での書き換えが波及しないように）
+        seen = set()
+        ordered = []
+        for text in texts:
+            result = by_text[text]
+            ordered.append(copy.deepcopy(result) if text in seen else result)
+            seen.add(text)
+        return ordered
+
+    async def _classify_batch(self, texts: List[str], user_context: Optional[Dict] = None) -> Dict[str, Dict[str, Any]]:
+        """複数の発言を1回のAPI呼び出しで分類（返せなかった発言は個別の問い合わせに任せる）"""
+        classified = {}
+        try:
+            context_info = _time_context(datetime.now(JST))
+            if user_context:
+                context_info += _USER_INFO_PREFIX + _dumps_compact(user_context) + "\n"
+            
+            messages = [
+                self._system_message,
+                _INTENT_BATCH_SYSTEM_MESSAGE,
+                {"role": "system", "content": context_info},
+                {"role": "user", "content": _dumps_compact(
+                    {"turns": [{"idx": i, "text": text} for i, text in enumerate(texts)]}
+                )}
+            ]
+            
+            async with self._request_semaphore:
+                await openai_rate_limiter.acquire()
+                response = await self.client.chat.completions.create(
+                    model=self.intent_model,
+                    messages=messages,
+                    max_completion_tokens=1000 * len(texts),
+                    response_format=_INTENT_BATCH_RESPONSE_FORMAT
+                )
+            
+            results = _loads_json(response.choices[0].message.content).get('results') or []
+            by_idx = {item.pop('idx', None): item for item in results if isinstance(item, dict)}
+            if len(by_idx) != len(texts):
+                logger.warning(f"Batch intent result count mismatch: {len(by_idx)} for {len(texts)} texts")
+            
+            # 返ってきた分だけ使う（欠けた発言は個別に問い合わせられる）
+            for i, text in enumerate(texts):
+                result = by_idx.get(i)
+                if result is not None:
+                    self._store_model_intent(_intent_cache_key(text), result)
+                    classified[text] = result
+            
+        except Exception as e:
+            logger.error(f"Error in batch intent understanding: {e}")
+        return classified
+
+    def _store_model_intent(self, cache_key: str, result: Dict[str, Any]):
+        """モデルが返した意図理解結果を整えてキャッシュ"""
+        # アクション名は種類が限られるのでinternして共有（ハンドラー表の引きも同一性比較で済む）
+        if isinstance(result.get('action'), str):
+            result['action'] = intern(result['action'])
+        # 日時を含む結果は時間が経つと指す時刻がずれるのでキャッシュしない
+        parameters = result.get('parameters')
+        if isinstance(parameters, dict) and any(parameters.get(key) for key in _TIME_PARAMETER_KEYS):
+            return
+        # 返答文は発言したユーザー宛てに書かれているのでキャッシュしない（ヒット時はgenerate_responseで作り直す）
+        if 'reply' in result:
+            result = {key: value for key, value in result.items() if key != 'reply'}
+        self._store_cached_intent(cache_key, result)
+
+    def _get_cached_intent(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """キャッシュ済みの意図理解結果を取得（後処理で書き換わるのでコピーを返す）"""
+        entry = self._intent_cache.get(cache_key)
+        if entry and time.monotonic() - entry[1] >= INTENT_CACHE_TTL:
+            del self._intent_cache[cache_key]
+            entry = None
+        if not entry:
+            self._intent_cache_misses += 1
+            return None
+        self._intent_cache_hits += 1
+        self._intent_cache.move_to_end(cache_key)
+        return copy.deepcopy(entry[0])
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """意図理解キャッシュのヒット状況"""
+        total = self._intent_cache_hits + self._intent_cache_misses
+        return {
+            'size': len(self._intent_cache),
+            'hits': self._intent_cache_hits,
+            'misses': self._intent_cache_misses,
+            'hit_rate': self._intent_cache_hits / total if total else 0.0
+        }
+
+    def _store_cached_intent(self, cache_key: str, result: Dict[str, Any]):
+        """意図理解結果をキャッシュ（古いものから破棄）"""
+        self._intent_cache[cache_key] = (copy.deepcopy(result), time.monotonic())
+        self._intent_cache.move_to_end(cache_key)
+        if len(self._intent_cache) > INTENT_CACHE_SIZE:
+            self._intent_cache.popitem(last=False)
+
     async def _post_process_result(self, result: Dict, original_text: str, current_time: datetime) -> Dict[str, Any]:
         """結果の後処理と検証"""
         try:
@@ -201,55 +535,68 @@ class AdvancedNLU:
             if 'T' in datetime_str:
                 return datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
             
-            # その他の形式は従来のtodo_nlu.pyの_detect_due_dateを使用
-            from src.todo_nlu import TodoNLU
-            nlu = TodoNLU()
-            return nlu._detect_due_date(datetime_str.lower())
+            # その他の形式は従来のtodo_nlu.pyの_detect_due_dateを使用（共有インスタンスを再利用）
+            from src.todo_nlu import todo_nlu
+            return todo_nlu._detect_due_date(datetime_str.lower())
             
         except Exception as e:
             logger.warning(f"Failed to parse datetime '{datetime_str}': {e}")
             return None
 
-    async def generate_response(self, intent_result: Dict, execution_result: Optional[Dict] = None) -> str:
+    async def generate_response(self, intent_result: Dict, execution_result: Optional[Dict] = None,
+                                on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
         """
         実行結果に基づいて自然な返答を生成
         
         Args:
             intent_result: 意図理解の結果
             execution_result: アクション実行の結果
+            on_partial: 指定時はストリーミングし、生成途中の全文を都度渡す
             
         Returns:
             自然な返答文字列
         """
         try:
-            # 魔女風の性格を含むプロンプト
-            response_prompt = """あなたは荒れ地の魔女のような品のあるおばあさんの性格を持つCatherine AIです。
-以下の特徴で返答してください:
-- 「ふふ、○○だね」「やれやれ、○○だよ」のような話し方
-- 「あらあら」「おやおや」「まったく」などの口癖
-- 品があって少し意地悪だけど優しい
-- ユーザーのことを気にかけている
-
-実行結果に基づいて、自然で魔女らしい返答を生成してください。
-成功の場合は満足そうに、失敗の場合は心配そうに返答してください。"""
-
-            context = f"""
-意図理解結果: {json.dumps(intent_result, ensure_ascii=False)}
-実行結果: {json.dumps(execution_result, ensure_ascii=False) if execution_result else "なし"}
-"""
+            user_content = (
+                _RESPONSE_INTENT_PREFIX + _dumps_compact(intent_result)
+                + _RESPONSE_EXECUTION_PREFIX
+                + (_dumps_compact(execution_result) if execution_result else "なし")
+                + _RESPONSE_SUFFIX
+            )
 
             messages = [
-                {"role": "system", "content": response_prompt},
-                {"role": "user", "content": context + "\n\n適切な返答を生成してください。"}
+                _RESPONSE_SYSTEM_MESSAGE,
+                {"role": "user", "content": user_content}
             ]
+            model = self.action_response_model if execution_result else self.model
 
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_completion_tokens=500
-            )
+            if on_partial is None:
+                async with self._request_semaphore:
+                    await openai_rate_limiter.acquire()
+                    response = await self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_completion_tokens=500
+                    )
+                return response.choices[0].message.content.strip()
+
+            # ストリーミング: 最初のトークンから表示できるようにする
+            # （非ストリーミング時と同じく同時リクエスト数の上限に含める）
+            text = ""
+            async with self._request_semaphore:
+                await openai_rate_limiter.acquire()
+                stream = await self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_completion_tokens=500,
+                    stream=True
+                )
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        text += chunk.choices[0].delta.content
+                        await on_partial(text)
 
-            return response.choices[0].message.content.strip()
+            return text.strip()
 
         except Exception as e:
             logger.error(f"Error generating response: {e}")
@@ -4,7 +4,7 @@ from typing import Optional, List
 SEPARATOR_TOKEN = "<|endoftext|>"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Message:
     user: str
     text: Optional[str] = None
@@ -16,7 +16,7 @@ class Message:
         return result
 
 
-@dataclass
+@dataclass(slots=True)
 class Conversation:
     messages: List[Message]
 
@@ -30,21 +30,21 @@ class Conversation:
         )
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Config:
     name: str
     instructions: str
     example_conversations: List[Conversation]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ThreadConfig:
     model: str
     max_tokens: int
     temperature: float
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Prompt:
     header: Message
     examples: List[Conversation]
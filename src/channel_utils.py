@@ -4,12 +4,27 @@ Catherineが特定のチャンネルでのみ動作するように制御
 """
 
 import logging
-from typing import Optional, List
+from typing import Optional
 from discord import Message as DiscordMessage, TextChannel, DMChannel, Thread
 from src.constants import ALLOWED_CHANNEL_NAMES, CATHERINE_CHANNELS, ALLOWED_CHANNEL_IDS, CATHERINE_CHANNEL_IDS
 
 logger = logging.getLogger(__name__)
 
+# 設定値は起動後に変わらないので、小文字化・集合化は一度だけ行う
+_ALLOWED_NAMES_LOWER = frozenset(name.strip().lower() for name in ALLOWED_CHANNEL_NAMES)
+_CATHERINE_NAMES_LOWER = frozenset(name.strip().lower() for name in CATHERINE_CHANNELS)
+
+# テキスト内でのCatherine言及
+_CATHERINE_TEXT_MENTIONS = ('catherine', 'キャサリン', 'カトリーヌ')
+
+def _channel_name_lower(message: DiscordMessage) -> Optional[str]:
+    """判定に使うチャンネル名（スレッドなら親チャンネル名）を小文字で返す"""
+    if isinstance(message.channel, TextChannel):
+        return message.channel.name.lower()
+    if isinstance(message.channel, Thread) and message.channel.parent:
+        return message.channel.parent.name.lower()
+    return None
+
 def is_allowed_channel(message: DiscordMessage) -> bool:
     """
     メッセージが許可されたチャンネルから送信されたかチェック
@@ -35,17 +50,10 @@ def is_allowed_channel(message: DiscordMessage) -> bool:
             return True
     
     # フォールバック：チャンネル名による判定
-    channel_name = None
-    if isinstance(message.channel, TextChannel):
-        channel_name = message.channel.name.lower()
-    elif isinstance(message.channel, Thread):
-        # スレッドの場合は親チャンネル名を使用
-        if message.channel.parent:
-            channel_name = message.channel.parent.name.lower()
+    channel_name = _channel_name_lower(message)
     
     if channel_name:
-        allowed_names = [name.strip().lower() for name in ALLOWED_CHANNEL_NAMES]
-        is_allowed_by_name = channel_name in allowed_names
+        is_allowed_by_name = channel_name in _ALLOWED_NAMES_LOWER
         
         if is_allowed_by_name:
             logger.info(f"Channel '{channel_name}' (ID: {channel_id}) - allowed (name-based fallback)")
@@ -79,17 +87,10 @@ def is_catherine_channel(message: DiscordMessage) -> bool:
             return True
     
     # フォールバック：チャンネル名による判定
-    channel_name = None
-    if isinstance(message.channel, TextChannel):
-        channel_name = message.channel.name.lower()
-    elif isinstance(message.channel, Thread):
-        # スレッドの場合は親チャンネル名を使用
-        if message.channel.parent:
-            channel_name = message.channel.parent.name.lower()
+    channel_name = _channel_name_lower(message)
     
     if channel_name:
-        catherine_names = [name.strip().lower() for name in CATHERINE_CHANNELS]
-        is_catherine_by_name = channel_name in catherine_names
+        is_catherine_by_name = channel_name in _CATHERINE_NAMES_LOWER
         
         if is_catherine_by_name:
             logger.info(f"Channel '{channel_name}' (ID: {channel_id}) - Catherine channel (name-based fallback)")
@@ -133,8 +134,7 @@ def should_respond_to_message(message: DiscordMessage, bot_user_id: int = None)
     content_lower = message.content.lower()
     
     # テキスト内でのCatherine言及
-    catherine_text_mentions = ['catherine', 'キャサリン', 'カトリーヌ']
-    text_mentioned = any(mention in content_lower for mention in catherine_text_mentions)
+    text_mentioned = any(mention in content_lower for mention in _CATHERINE_TEXT_MENTIONS)
     
     # Discord @メンション（Botユーザーへの言及）
     bot_mentioned = False
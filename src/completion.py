@@ -1,9 +1,10 @@
+import asyncio
 from enum import Enum
 from dataclasses import dataclass
 import openai
-from openai import AsyncOpenAI
 
 from src.moderation import moderate_message
+from src.openai_client import openai_client, openai_rate_limiter
 from typing import Optional, List
 from src.constants import (
     BOT_INSTRUCTIONS,
@@ -20,6 +21,18 @@ from src.moderation import (
 
 MY_BOT_NAME = BOT_NAME
 MY_BOT_EXAMPLE_CONVOS = EXAMPLE_CONVOS
+MY_BOT_HEADER = Message("system", f"Instructions for {MY_BOT_NAME}: {BOT_INSTRUCTIONS}")
+
+# instructions and example conversations never change, so render the system
+# message once; keeping it byte-identical also lets the API reuse the cached prefix
+MY_BOT_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": Prompt(
+        header=MY_BOT_HEADER,
+        examples=MY_BOT_EXAMPLE_CONVOS,
+        convo=Conversation([]),
+    ).render_system_prompt(),
+}
 
 
 class CompletionResult(Enum):
@@ -31,14 +44,14 @@ class CompletionResult(Enum):
     MODERATION_BLOCKED = 5
 
 
-@dataclass
+@dataclass(slots=True)
 class CompletionData:
     status: CompletionResult
     reply_text: Optional[str]
     status_text: Optional[str]
 
 
-client = AsyncOpenAI()
+client = openai_client
 
 
 async def generate_completion_response(
@@ -46,13 +59,12 @@ async def generate_completion_response(
 ) -> CompletionData:
     try:
         prompt = Prompt(
-            header=Message(
-                "system", f"Instructions for {MY_BOT_NAME}: {BOT_INSTRUCTIONS}"
-            ),
+            header=MY_BOT_HEADER,
             examples=MY_BOT_EXAMPLE_CONVOS,
             convo=Conversation(messages),
         )
-        rendered = prompt.full_render(MY_BOT_NAME)
+        rendered = [MY_BOT_SYSTEM_MESSAGE, *prompt.render_messages(MY_BOT_NAME)]
+        await openai_rate_limiter.acquire()
         response = await client.chat.completions.create(
             model=thread_config.model,
             messages=rendered,
@@ -63,8 +75,11 @@ async def generate_completion_response(
         )
         reply = response.choices[0].message.content.strip()
         if reply:
-            flagged_str, blocked_str = moderate_message(
-                message=(rendered[-1]["content"] + reply)[-500:], user=user
+            # only the trailing 500 chars are moderated, so never join the whole last message
+            tail_room = 500 - len(reply)
+            moderated = reply[-500:] if tail_room <= 0 else rendered[-1]["content"][-tail_room:] + reply
+            flagged_str, blocked_str = await moderate_message(
+                message=moderated, user=user
             )
             if len(blocked_str) > 0:
                 return CompletionData(
@@ -102,6 +117,17 @@ async def generate_completion_response(
         )
 
 
+async def _notify_with_moderation_log(log_coro, notice_coro):
+    # the moderation-channel log and the in-thread notice don't depend on each other
+    log_result, notice_result = await asyncio.gather(
+        log_coro, notice_coro, return_exceptions=True
+    )
+    if isinstance(log_result, Exception):
+        logger.error(f"Failed to send moderation log: {log_result}")
+    if isinstance(notice_result, Exception):
+        raise notice_result
+
+
 async def process_response(
     user: str, thread: discord.Thread, response_data: CompletionData
 ):
@@ -122,33 +148,35 @@ async def process_response(
             for r in shorter_response:
                 sent_message = await thread.send(r)
         if status is CompletionResult.MODERATION_FLAGGED:
-            await send_moderation_flagged_message(
+            await _notify_with_moderation_log(
+                send_moderation_flagged_message(
+                    guild=thread.guild,
+                    user=user,
+                    flagged_str=status_text,
+                    message=reply_text,
+                    url=sent_message.jump_url if sent_message else "no url",
+                ),
+                thread.send(
+                    embed=discord.Embed(
+                        description=f"⚠️ **This conversation has been flagged by moderation.**",
+                        color=discord.Color.yellow(),
+                    )
+                ),
+            )
+    elif status is CompletionResult.MODERATION_BLOCKED:
+        await _notify_with_moderation_log(
+            send_moderation_blocked_message(
                 guild=thread.guild,
                 user=user,
-                flagged_str=status_text,
+                blocked_str=status_text,
                 message=reply_text,
-                url=sent_message.jump_url if sent_message else "no url",
-            )
-
-            await thread.send(
+            ),
+            thread.send(
                 embed=discord.Embed(
-                    description=f"⚠️ **This conversation has been flagged by moderation.**",
-                    color=discord.Color.yellow(),
+                    description=f"❌ **The response has been blocked by moderation.**",
+                    color=discord.Color.red(),
                 )
-            )
-    elif status is CompletionResult.MODERATION_BLOCKED:
-        await send_moderation_blocked_message(
-            guild=thread.guild,
-            user=user,
-            blocked_str=status_text,
-            message=reply_text,
-        )
-
-        await thread.send(
-            embed=discord.Embed(
-                description=f"❌ **The response has been blocked by moderation.**",
-                color=discord.Color.red(),
-            )
+            ),
         )
     elif status is CompletionResult.TOO_LONG:
         await close_thread(thread)
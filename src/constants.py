@@ -2,13 +2,31 @@ from dotenv import load_dotenv
 import os
 import dacite
 import yaml
-from typing import Dict, List, Literal
+from typing import Dict, List, Literal, Optional
 
 from src.base import Config
 
 load_dotenv()
 
 
+def first_env(*names: str) -> Optional[str]:
+    """Return the first non-empty value among the given env var names."""
+    for name in names:
+        value = os.environ.get(name)
+        if value:
+            return value
+    return None
+
+
+def require_env(*names: str) -> str:
+    """Like first_env, but fail fast at import time when none of the names is set."""
+    value = first_env(*names)
+    if not value:
+        print(f"ERROR: None of {', '.join(names)} found in environment variables")
+        raise ValueError(f"{' or '.join(names)} is required")
+    return value
+
+
 # load config.yaml
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
 CONFIG: Config = dacite.from_dict(
@@ -24,18 +42,14 @@ if os.environ.get("DEBUG_ENV"):
     print("DEBUG: Discord-related keys:", [k for k in os.environ.keys() if "DISCORD" in k])
 
 # Support both DISCORD_BOT_TOKEN and DISCORD_TOKEN for flexibility
-DISCORD_BOT_TOKEN = os.environ.get("DISCORD_BOT_TOKEN") or os.environ.get("DISCORD_TOKEN")
-if not DISCORD_BOT_TOKEN:
-    print("ERROR: Neither DISCORD_BOT_TOKEN nor DISCORD_TOKEN found in environment variables")
-    print("Available env vars:", list(os.environ.keys())[:10])  # Show first 10 keys
-    raise ValueError("DISCORD_BOT_TOKEN or DISCORD_TOKEN is required")
+DISCORD_BOT_TOKEN = require_env("DISCORD_BOT_TOKEN", "DISCORD_TOKEN")
 
 # Log which token source is being used
-if os.environ.get("DISCORD_TOKEN"):
+if not os.environ.get("DISCORD_BOT_TOKEN"):
     print("INFO: Using DISCORD_TOKEN from environment")
 
 # Support multiple naming conventions and debug
-DISCORD_CLIENT_ID = os.environ.get("DISCORD_CLIENT_ID") or os.environ.get("CLIENT_ID") or os.environ.get("DISCORD_APPLICATION_ID")
+DISCORD_CLIENT_ID = first_env("DISCORD_CLIENT_ID", "CLIENT_ID", "DISCORD_APPLICATION_ID")
 if not DISCORD_CLIENT_ID:
     print("ERROR: DISCORD_CLIENT_ID not found")
     print("All environment variables:", sorted(os.environ.keys()))
@@ -45,9 +59,7 @@ if not DISCORD_CLIENT_ID:
     print("WARNING: Using hardcoded CLIENT_ID for debugging")
 
 # Support multiple naming conventions for OpenAI
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY") or os.environ.get("OPENAI_KEY") 
-if not OPENAI_API_KEY:
-    print("ERROR: OPENAI_API_KEY not found")
+OPENAI_API_KEY = require_env("OPENAI_API_KEY", "OPENAI_KEY")
 
 # Channel configuration  
 ALLOWED_CHANNEL_NAMES = os.environ.get("ALLOWED_CHANNEL_NAMES", "catherine,todo,general").split(",")
@@ -68,11 +80,7 @@ if os.environ.get("CATHERINE_CHANNEL_IDS"):
     except ValueError:
         print("WARNING: Invalid CATHERINE_CHANNEL_IDS format")
 
-if not OPENAI_API_KEY:
-    print("Checking for OpenAI-related env vars:", [k for k in os.environ.keys() if "OPENAI" in k or "API" in k])
-    raise ValueError("OPENAI_API_KEY is required")
-
-DEFAULT_MODEL = os.environ.get("DEFAULT_MODEL") or os.environ.get("MODEL") or "gpt-5-mini"
+DEFAULT_MODEL = first_env("DEFAULT_MODEL", "MODEL") or "gpt-5-mini"
 
 ALLOWED_SERVER_IDS: List[int] = []
 server_ids_str = os.environ.get("ALLOWED_SERVER_IDS", "")
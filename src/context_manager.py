@@ -2,20 +2,45 @@
 コンテキスト管理システム - Firebase履歴管理の拡張
 """
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Any
 import pytz
 import logging
 import json
+import re
+import asyncio
+import time
+from collections import OrderedDict
+from itertools import islice
 
 logger = logging.getLogger(__name__)
 
+# ユーザー設定キャッシュの有効期間（秒）
+PREFERENCES_CACHE_TTL = 60
+# 有効期間を過ぎてもこの秒数までは古い値を返し、裏で取り直す
+PREFERENCES_CACHE_STALE = 300
+# ユーザー設定キャッシュに保持する最大ユーザー数
+PREFERENCES_CACHE_SIZE = 5000
+# 同じ設定値の再書き込みを抑止する期間（秒）と記録する最大件数
+PREFERENCE_WRITE_DEBOUNCE = 30
+PREFERENCE_WRITE_LRU_SIZE = 10000
+
+# learn_from_interaction が反応する語（どれも含まない発言は解析しない）
+_LEARNING_TRIGGER_PATTERN = re.compile(r'呼んで|名前|朝|夜|プロジェクト|案件')
+
 class ContextManager:
     """会話コンテキストと履歴を管理"""
     
     def __init__(self):
+        # user_id -> (設定, 取得時刻) のLRU
+        self._preferences_cache: OrderedDict = OrderedDict()
+        # user_id -> 実行中の設定読み込み（同じユーザーの同時読み込みを1回にまとめる）
+        self._preferences_in_flight: Dict[str, asyncio.Task] = {}
+        # (user_id, preference_key) -> (値, 書き込み時刻) のLRU
+        self._recent_preference_writes: OrderedDict = OrderedDict()
         try:
-            from firebase_config import firebase_manager
+            from firebase_config import firebase_manager, firestore_batch_writer
             self.db = firebase_manager.get_db()
+            self.batch_writer = firestore_batch_writer
             if not self.db:
                 logger.error("Firebase not available for ContextManager")
         except ImportError:
@@ -28,22 +53,34 @@ class ContextManager:
             if not self.db:
                 return False
             
-            doc_ref = self.db.collection('user_preferences').document(user_id)
-            doc = doc_ref.get()
+            # 直近に同じ値を書き込んでいればスキップ（連投時の書き込み抑止）
+            write_key = (user_id, preference_key)
+            now = time.monotonic()
+            recent = self._recent_preference_writes.get(write_key)
+            if recent and recent[0] == preference_value and now - recent[1] < PREFERENCE_WRITE_DEBOUNCE:
+                return True
             
-            if doc.exists:
-                # 既存の設定を更新
-                doc_ref.update({
-                    preference_key: preference_value,
-                    'updated_at': datetime.now(pytz.UTC)
-                })
-            else:
-                # 新規作成
-                doc_ref.set({
-                    preference_key: preference_value,
-                    'created_at': datetime.now(pytz.UTC),
-                    'updated_at': datetime.now(pytz.UTC)
-                })
+            # 存在確認の読み込みはせず、マージ書き込み1回で作成・更新を兼ねる
+            doc_ref = self.db.collection('user_preferences').document(user_id)
+            await asyncio.to_thread(doc_ref.set, {
+                preference_key: preference_value,
+                'updated_at': datetime.now(pytz.UTC)
+            }, merge=True)
+            
+            # 書き込み前に始まった読み込みは古い内容なので、キャッシュへ反映させない
+            self._preferences_in_flight.pop(user_id, None)
+            
+            # キャッシュ済みなら書き込んだ値で更新（次の読み込みでFirestoreを引き直さない）
+            cached = self._preferences_cache.get(user_id)
+            if cached:
+                preferences = dict(cached[0])
+                preferences[preference_key] = preference_value
+                self._preferences_cache[user_id] = (preferences, cached[1])
+            
+            self._recent_preference_writes[write_key] = (preference_value, now)
+            self._recent_preference_writes.move_to_end(write_key)
+            if len(self._recent_preference_writes) > PREFERENCE_WRITE_LRU_SIZE:
+                self._recent_preference_writes.popitem(last=False)
             
             logger.info(f"Saved preference for user {user_id}: {preference_key}")
             return True
@@ -58,37 +95,79 @@ class ContextManager:
             if not self.db:
                 return {}
             
-            doc_ref = self.db.collection('user_preferences').document(user_id)
-            doc = doc_ref.get()
+            cached = self._preferences_cache.get(user_id)
+            if cached:
+                age = time.monotonic() - cached[1]
+                if age < PREFERENCES_CACHE_STALE:
+                    self._preferences_cache.move_to_end(user_id)
+                    # TTLを過ぎていれば古い値を返しつつ裏で取り直す
+                    if age >= PREFERENCES_CACHE_TTL:
+                        self._load_user_preferences_shared(user_id)
+                    return dict(cached[0])
             
-            if doc.exists:
-                preferences = doc.to_dict()
-                # タイムスタンプを除外
-                preferences.pop('created_at', None)
-                preferences.pop('updated_at', None)
-                return preferences
-            
-            return {}
+            # キャッシュがなければ読み込みを待つ（同時の呼び出しは同じ読み込みを待つ）
+            preferences = await asyncio.shield(self._load_user_preferences_shared(user_id))
+            return dict(preferences)
             
         except Exception as e:
             logger.error(f"Failed to get user preferences: {e}")
             return {}
     
+    def _load_user_preferences_shared(self, user_id: str) -> asyncio.Task:
+        """実行中の読み込みがあればそれを、なければ新しく読み込みを始めて返す"""
+        task = self._preferences_in_flight.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._load_user_preferences(user_id))
+            self._preferences_in_flight[user_id] = task
+            task.add_done_callback(lambda t: self._on_preferences_loaded(user_id, t))
+        return task
+    
+    def _on_preferences_loaded(self, user_id: str, task: asyncio.Task):
+        """読み込み完了時の後始末（裏での取り直しの失敗はここでログに残す）"""
+        if self._preferences_in_flight.get(user_id) is task:
+            del self._preferences_in_flight[user_id]
+        if not task.cancelled() and task.exception():
+            logger.error(f"Failed to load user preferences: {task.exception()}")
+    
+    async def _load_user_preferences(self, user_id: str) -> Dict[str, Any]:
+        """Firestoreからユーザーの好みを読み込んでキャッシュ"""
+        doc_ref = self.db.collection('user_preferences').document(user_id)
+        doc = await asyncio.to_thread(doc_ref.get)
+        
+        preferences = {}
+        if doc.exists:
+            preferences = doc.to_dict()
+            # タイムスタンプを除外
+            preferences.pop('created_at', None)
+            preferences.pop('updated_at', None)
+        
+        # 読み込み中に設定が書き込まれていたら（実行中の読み込みから外されていたら）キャッシュしない
+        if self._preferences_in_flight.get(user_id) is not asyncio.current_task():
+            return preferences
+        
+        self._preferences_cache[user_id] = (preferences, time.monotonic())
+        self._preferences_cache.move_to_end(user_id)
+        if len(self._preferences_cache) > PREFERENCES_CACHE_SIZE:
+            self._preferences_cache.popitem(last=False)
+        return preferences
+    
     async def save_important_context(self, user_id: str, context_type: str, context_data: Dict[str, Any]) -> bool:
         """重要なコンテキストを保存"""
         try:
             if not self.db:
                 return False
             
+            now = datetime.now(pytz.UTC)
             context_entry = {
                 'user_id': user_id,
                 'context_type': context_type,
                 'data': context_data,
-                'timestamp': datetime.now(pytz.UTC),
-                'expires_at': datetime.now(pytz.UTC) + timedelta(days=30)  # 30日後に期限切れ
+                'timestamp': now,
+                'expires_at': now + timedelta(days=30)  # 30日後に期限切れ
             }
             
-            self.db.collection('important_contexts').add(context_entry)
+            # 追記のみの書き込みなのでバッチへ積んで応答を待たせない
+            self.batch_writer.add('important_contexts', context_entry)
             logger.info(f"Saved important context for user {user_id}: {context_type}")
             return True
             
@@ -112,7 +191,7 @@ class ContextManager:
                     .limit(limit))
             
             contexts = []
-            for doc in query.stream():
+            for doc in await asyncio.to_thread(query.get):
                 context = doc.to_dict()
                 contexts.append({
                     'type': context.get('context_type'),
@@ -132,16 +211,17 @@ class ContextManager:
             if not self.db:
                 return False
             
+            now = datetime.now(pytz.UTC)
             summary_entry = {
                 'user_id': user_id,
                 'channel_id': channel_id,
                 'summary': summary,
                 'key_points': key_points,
-                'timestamp': datetime.now(pytz.UTC),
-                'expires_at': datetime.now(pytz.UTC) + timedelta(days=7)  # 7日後に期限切れ
+                'timestamp': now,
+                'expires_at': now + timedelta(days=7)  # 7日後に期限切れ
             }
             
-            self.db.collection('conversation_summaries').add(summary_entry)
+            self.batch_writer.add('conversation_summaries', summary_entry)
             logger.info(f"Saved conversation summary for user {user_id}")
             return True
             
@@ -164,7 +244,7 @@ class ContextManager:
                     .limit(limit))
             
             summaries = []
-            for doc in query.stream():
+            for doc in await asyncio.to_thread(query.get):
                 summary = doc.to_dict()
                 summaries.append({
                     'summary': summary.get('summary'),
@@ -181,26 +261,24 @@ class ContextManager:
     async def build_context_prompt(self, user_id: str) -> str:
         """ユーザーのコンテキストからプロンプトを構築"""
         try:
-            # ユーザーの好みを取得
-            preferences = await self.get_user_preferences(user_id)
-            
-            # 最近の重要コンテキストを取得
-            recent_contexts = await self.get_recent_context(user_id)
-            
-            # 最近の会話要約を取得
-            recent_summaries = await self.get_recent_summaries(user_id)
+            # ユーザーの好み・最近の重要コンテキスト・会話要約は互いに独立なので並行して取得
+            preferences, recent_contexts, recent_summaries = await asyncio.gather(
+                self.get_user_preferences(user_id),
+                self.get_recent_context(user_id),
+                self.get_recent_summaries(user_id)
+            )
             
             context_parts = []
             
             # ユーザーの好みを追加
             if preferences:
-                pref_str = "ユーザーの設定: " + ", ".join([f"{k}={v}" for k, v in preferences.items()])
+                pref_str = "ユーザーの設定: " + ", ".join([f"{k}={v}" for k, v in sorted(preferences.items())])
                 context_parts.append(pref_str)
             
             # 重要なコンテキストを追加
             if recent_contexts:
-                for ctx in recent_contexts[:3]:  # 最大3つ
-                    context_parts.append(f"重要事項({ctx['type']}): {json.dumps(ctx['data'], ensure_ascii=False)}")
+                for ctx in islice(recent_contexts, 3):  # 最大3つ
+                    context_parts.append(f"重要事項({ctx['type']}): {json.dumps(ctx['data'], ensure_ascii=False, separators=(',', ':'), sort_keys=True, default=str)}")
             
             # 会話要約を追加
             if recent_summaries and recent_summaries[0]:
@@ -221,30 +299,38 @@ class ContextManager:
     async def learn_from_interaction(self, user_id: str, message: str, response: str) -> None:
         """対話から学習して重要な情報を抽出"""
         try:
-            # 特定のパターンを検出して好みを保存
+            # ほとんどの発言は学習対象の語を含まないので1回の検索で打ち切る
+            if not _LEARNING_TRIGGER_PATTERN.search(message):
+                return
+            
+            # 特定のパターンを検出して好みを保存（書き込み先は互いに独立なのでまとめて並行実行）
             message_lower = message.lower()
+            writes = []
             
             # 呼び方の好みを検出
             if "呼んで" in message_lower or "名前" in message_lower:
                 if "さん" in message:
-                    await self.save_user_preference(user_id, "preferred_honorific", "さん")
+                    writes.append(self.save_user_preference(user_id, "preferred_honorific", "さん"))
                 elif "ちゃん" in message:
-                    await self.save_user_preference(user_id, "preferred_honorific", "ちゃん")
+                    writes.append(self.save_user_preference(user_id, "preferred_honorific", "ちゃん"))
                 elif "くん" in message:
-                    await self.save_user_preference(user_id, "preferred_honorific", "くん")
+                    writes.append(self.save_user_preference(user_id, "preferred_honorific", "くん"))
             
             # 作業時間の好みを検出
             if "朝" in message_lower and ("作業" in message_lower or "仕事" in message_lower):
-                await self.save_user_preference(user_id, "work_time", "morning")
+                writes.append(self.save_user_preference(user_id, "work_time", "morning"))
             elif "夜" in message_lower and ("作業" in message_lower or "仕事" in message_lower):
-                await self.save_user_preference(user_id, "work_time", "night")
+                writes.append(self.save_user_preference(user_id, "work_time", "night"))
             
             # プロジェクト名や重要な固有名詞を検出
             if "プロジェクト" in message_lower or "案件" in message_lower:
-                await self.save_important_context(user_id, "project_mention", {
+                writes.append(self.save_important_context(user_id, "project_mention", {
                     "message": message,
                     "timestamp": datetime.now(pytz.UTC).isoformat()
-                })
+                }))
+            
+            if writes:
+                await asyncio.gather(*writes)
             
         except Exception as e:
             logger.error(f"Failed to learn from interaction: {e}")
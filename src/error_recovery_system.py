@@ -4,19 +4,34 @@
 """
 import logging
 import asyncio
-import traceback
-from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
+import heapq
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Dict, Any
+from datetime import datetime
 import pytz
 
 logger = logging.getLogger(__name__)
 
+# 東京タイムゾーン（呼び出しごとに引かない）
+JST = pytz.timezone('Asia/Tokyo')
+
+# エラー記録を保持するキー（エラー種別×ユーザー）の上限
+MAX_TRACKED_ERROR_KEYS = 4096
+
+
+@dataclass(slots=True)
+class ErrorRecord:
+    """エラー種別ごとの発生回数と発生時刻"""
+    count: int
+    first_seen: datetime
+    last_seen: datetime
+
 class ErrorRecoverySystem:
     """エラー回復とフォールバックシステム"""
     
     def __init__(self):
-        self.error_counts = {}  # エラー頻度追跡
-        self.last_errors = {}   # 最新エラー記録
+        self.error_counts = OrderedDict()  # エラー頻度追跡（古いキーから破棄）
         self.recovery_strategies = self._init_recovery_strategies()
     
     def _init_recovery_strategies(self) -> Dict[str, Dict[str, Any]]:
@@ -101,7 +116,7 @@ class ErrorRecoverySystem:
                 'message': fallback_result['message'],
                 'fallback_data': fallback_result.get('data'),
                 'error_type': error_type,
-                'retry_count': self.error_counts.get(error_key, {}).get('count', 0)
+                'retry_count': self.error_counts[error_key].count if error_key in self.error_counts else 0
             }
             
         except Exception as recovery_error:
@@ -146,37 +161,37 @@ class ErrorRecoverySystem:
     
     def _record_error(self, error_key: str, error: Exception):
         """エラー記録"""
-        now = datetime.now(pytz.timezone('Asia/Tokyo'))
+        now = datetime.now(JST)
         
-        if error_key not in self.error_counts:
-            self.error_counts[error_key] = {'count': 0, 'first_seen': now, 'last_seen': now}
+        record = self.error_counts.get(error_key)
+        if record is None:
+            record = self.error_counts[error_key] = ErrorRecord(0, now, now)
         
-        self.error_counts[error_key]['count'] += 1
-        self.error_counts[error_key]['last_seen'] = now
-        self.last_errors[error_key] = {
-            'error': str(error),
-            'traceback': traceback.format_exc(),
-            'timestamp': now
-        }
+        record.count += 1
+        record.last_seen = now
+        
+        # 最近発生したキーを末尾へ寄せ、上限を超えたら最も古いキーを破棄
+        self.error_counts.move_to_end(error_key)
+        while len(self.error_counts) > MAX_TRACKED_ERROR_KEYS:
+            self.error_counts.popitem(last=False)
         
-        logger.error(f"Error recorded: {error_key} (count: {self.error_counts[error_key]['count']})")
+        logger.error(f"Error recorded: {error_key} (count: {record.count}): {error}")
     
     async def _should_retry(self, error_key: str, strategy: Dict[str, Any]) -> bool:
         """再試行すべきか判定"""
         if strategy['max_retries'] == 0:
             return False
         
-        error_info = self.error_counts.get(error_key, {})
-        retry_count = error_info.get('count', 0)
+        record = self.error_counts.get(error_key)
+        retry_count = record.count if record else 0
         
         # 最大再試行回数チェック
         if retry_count > strategy['max_retries']:
             return False
         
         # 時間ベースの制限（同じエラーが頻発している場合）
-        last_seen = error_info.get('last_seen')
-        if last_seen and retry_count > 1:
-            time_since_last = datetime.now(pytz.timezone('Asia/Tokyo')) - last_seen
+        if record and retry_count > 1:
+            time_since_last = datetime.now(JST) - record.last_seen
             if time_since_last.total_seconds() < 60:  # 1分以内に複数回エラーなら停止
                 return False
         
@@ -290,29 +305,30 @@ class ErrorRecoverySystem:
     
     def get_error_stats(self) -> Dict[str, Any]:
         """エラー統計を取得"""
-        now = datetime.now(pytz.timezone('Asia/Tokyo'))
+        now = datetime.now(JST)
         stats = {
-            'total_errors': sum(info['count'] for info in self.error_counts.values()),
+            'total_errors': sum(record.count for record in self.error_counts.values()),
             'error_types': len(self.error_counts),
             'recent_errors': {},
             'most_common_errors': []
         }
         
         # 最近のエラー（過去1時間）
-        for error_key, info in self.error_counts.items():
-            if (now - info['last_seen']).total_seconds() < 3600:
-                stats['recent_errors'][error_key] = info['count']
+        for error_key, record in self.error_counts.items():
+            if (now - record.last_seen).total_seconds() < 3600:
+                stats['recent_errors'][error_key] = record.count
         
-        # 最も頻繁なエラー
-        sorted_errors = sorted(self.error_counts.items(), key=lambda x: x[1]['count'], reverse=True)
-        stats['most_common_errors'] = sorted_errors[:5]
+        # 最も頻繁なエラー（統計の形は従来どおり辞書で返す）
+        stats['most_common_errors'] = [
+            (error_key, asdict(record))
+            for error_key, record in heapq.nlargest(5, self.error_counts.items(), key=lambda x: x[1].count)
+        ]
         
         return stats
     
     def reset_error_counts(self):
         """エラーカウントをリセット"""
         self.error_counts.clear()
-        self.last_errors.clear()
         logger.info("Error counts reset")
 
 # グローバルインスタンス
@@ -4,15 +4,40 @@ Notion + Google Calendar でメモリ管理を一切使用しない
 """
 import asyncio
 import json
-import uuid
+import random
+import re
+import secrets
+import time
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 import pytz
-import discord
 
 logger = logging.getLogger(__name__)
 
+# 東京タイムゾーン（呼び出しごとに引かない）
+JST = pytz.timezone('Asia/Tokyo')
+
+# 時間表現パターン
+_TIME_AFTER_PATTERN = re.compile(r'(?:(\d+)時間)?(?:(\d+)分)?後')   # 「○時間○分後」「○分後」「○時間後」
+_DAY_TIME_PATTERN = re.compile(r'(明日|今日).*?(\d{1,2})時(?:(\d{1,2})分)?')   # 「明日の○時」「今日の○時」
+_TIME_ONLY_PATTERN = re.compile(r'(\d{1,2})時(?:(\d{1,2})分)?')   # 「○時」「○時○分」
+_USERNAME_PATTERN = re.compile(r'@(\w+)')
+
+# リマインダー本文から取り除く語（メンション・チャンネル・時間表現など）を1本にまとめた正規表現
+_CLEAN_PATTERN = re.compile(
+    '|'.join([
+        r'@everyone', r'@here', r'@\w+',
+        r'#\w+',
+        r'\d+時間\d+分後', r'\d+時間後', r'\d+分後',
+        r'明日の?\d+時\d*分?', r'今日の?\d+時\d*分?',
+        r'明日', r'今日',
+        r'リマインド', r'を?に?で?'
+    ]),
+    re.IGNORECASE
+)
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
 class ExternalReminderManager:
     """
     完全外部API管理のリマインダーシステム
@@ -87,23 +112,20 @@ class ExternalReminderManager:
     
     def _generate_reminder_id(self) -> str:
         """一意なリマインダーIDを生成"""
-        return f"rem_{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}"
+        return f"rem_{int(time.time())}_{secrets.token_hex(4)}"
     
     def _parse_time_expression(self, text: str, reference_time: Optional[datetime] = None) -> Optional[datetime]:
         """
         自然言語の時間表現を解析
         flexible_reminder_system.pyから移植
         """
-        import re
-        
         if not reference_time:
-            reference_time = datetime.now(pytz.timezone('Asia/Tokyo'))
+            reference_time = datetime.now(JST)
         
         text = text.lower().strip()
         
         # 「○時間○分後」「○分後」「○時間後」
-        time_after_pattern = r'(?:(\d+)時間)?(?:(\d+)分)?後'
-        match = re.search(time_after_pattern, text)
+        match = _TIME_AFTER_PATTERN.search(text)
         if match:
             hours = int(match.group(1)) if match.group(1) else 0
             minutes = int(match.group(2)) if match.group(2) else 0
@@ -117,8 +139,7 @@ class ExternalReminderManager:
             return result_time
         
         # 「明日の○時」「今日の○時」
-        day_time_pattern = r'(明日|今日).*?(\d{1,2})時(?:(\d{1,2})分)?'
-        match = re.search(day_time_pattern, text)
+        match = _DAY_TIME_PATTERN.search(text)
         if match:
             day_modifier = match.group(1)
             hour = int(match.group(2))
@@ -135,8 +156,7 @@ class ExternalReminderManager:
             return target_time
         
         # 「○時」「○時○分」
-        time_only_pattern = r'(\d{1,2})時(?:(\d{1,2})分)?'
-        match = re.search(time_only_pattern, text)
+        match = _TIME_ONLY_PATTERN.search(text)
         if match:
             hour = int(match.group(1))
             minute = int(match.group(2)) if match.group(2) else 0
@@ -181,13 +201,12 @@ class ExternalReminderManager:
             
             # メンション解析
             mention_target = 'everyone'
-            import re
             if '@everyone' in text or 'everyone' in text:
                 mention_target = 'everyone'
             elif '@here' in text or 'here' in text:
                 mention_target = 'here'
             else:
-                username_match = re.search(r'@(\w+)', text)
+                username_match = _USERNAME_PATTERN.search(text)
                 if username_match:
                     mention_target = username_match.group(1)
             
@@ -199,20 +218,8 @@ class ExternalReminderManager:
                 channel_target = 'general'
             
             # メッセージ内容抽出
-            message = text
-            clean_patterns = [
-                r'@everyone', r'@here', r'@\w+',
-                r'#\w+',
-                r'\d+時間後', r'\d+分後', r'\d+時間\d+分後',
-                r'明日の?\d+時\d*分?', r'今日の?\d+時\d*分?',
-                r'明日', r'今日',
-                r'リマインド', r'を?に?で?'
-            ]
-            
-            for pattern in clean_patterns:
-                message = re.sub(pattern, '', message, flags=re.IGNORECASE)
-            
-            message = re.sub(r'\s+', ' ', message).strip()
+            message = _CLEAN_PATTERN.sub('', text)
+            message = _WHITESPACE_PATTERN.sub(' ', message).strip()
             if not message:
                 message = "リマインダー"
             
@@ -286,7 +293,7 @@ class ExternalReminderManager:
                 "channel_target": channel_target,
                 "status": "scheduled",
                 "created_by": user_id,
-                "created_at": datetime.now(pytz.timezone('Asia/Tokyo')).isoformat()
+                "created_at": datetime.now(JST).isoformat()
             }
             
             # Notion APIは今のところMCPブリッジ経由なので、実装は簡略化
@@ -322,7 +329,7 @@ class ExternalReminderManager:
             if not (self.google and self.google.is_configured()):
                 return
             
-            now = datetime.now(pytz.timezone('Asia/Tokyo'))
+            now = datetime.now(JST)
             
             # 今から15分以内のCatherineイベントを取得
             # 注意: Google Calendar API の実際の実装が必要
@@ -391,10 +398,11 @@ class ExternalReminderManager:
             
             # チャンネル検索
             target_channel = None
+            channel_target_lower = channel_target.lower()
             for guild in self.bot.guilds:
                 for channel in guild.channels:
                     if (hasattr(channel, 'send') and 
-                        channel.name.lower() == channel_target.lower()):
+                        channel.name.lower() == channel_target_lower):
                         target_channel = channel
                         break
                 if target_channel:
@@ -412,9 +420,10 @@ class ExternalReminderManager:
             else:
                 # ユーザー名検索
                 mention = f'@{mention_target}'
+                mention_target_lower = mention_target.lower()
                 for member in target_channel.guild.members:
-                    if (member.name.lower() == mention_target.lower() or 
-                        member.display_name.lower() == mention_target.lower()):
+                    if (member.name.lower() == mention_target_lower or 
+                        member.display_name.lower() == mention_target_lower):
                         mention = member.mention
                         break
             
@@ -428,7 +437,6 @@ class ExternalReminderManager:
                 "時計を見てごらん、時間だよ"
             ]
             
-            import random
             witch_intro = random.choice(witch_phrases)
             
             notification_message = f"{mention}\n🔔 **{witch_intro}**\n\n📋 {message}"
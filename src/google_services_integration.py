@@ -2,8 +2,6 @@
 Google Workspace統合システム - OAuth認証を使った実際のAPI統合
 """
 import logging
-import json
-import asyncio
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 import pytz
@@ -11,11 +9,12 @@ import os
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-import httpx
 
 logger = logging.getLogger(__name__)
 
+# 東京タイムゾーン（呼び出しごとに引かない）
+JST = pytz.timezone('Asia/Tokyo')
+
 class GoogleServicesIntegration:
     """Google Workspace サービス統合"""
     
@@ -436,7 +435,7 @@ class GoogleServicesIntegration:
                 self.calendar_service = self._get_service('calendar', 'v3')
             
             if not time_min:
-                time_min = datetime.now(pytz.timezone('Asia/Tokyo'))
+                time_min = datetime.now(JST)
             if not time_max:
                 time_max = time_min + timedelta(hours=24)
             
@@ -1,16 +1,36 @@
 """
 Catherine 自己学習システム - 魔女コメントの学習・改善
 """
-import json
+import asyncio
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import pytz
-from firebase_config import firebase_manager
+from firebase_admin import firestore
+from firebase_config import firebase_manager, firestore_batch_writer
 import logging
 import random
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+# 東京タイムゾーン（呼び出しごとに引かない）
+JST = pytz.timezone('Asia/Tokyo')
+
+# 種類別の集約ドキュメントに残す好評な返答の上限（ドキュメントが際限なく育たないように）
+LEARNED_RESPONSES_LIMIT = 50
+
+@lru_cache(maxsize=24)
+def _time_modifiers_for_hour(hour: int) -> tuple:
+    """その時刻に付ける時間帯修飾子の候補（時刻ごとに1回だけ判定）"""
+    if 5 <= hour < 10:
+        return ("朝から", "早起きして", "今日も")
+    elif 12 <= hour < 15:
+        return ("お昼に", "午後も", "")
+    elif 18 <= hour < 22:
+        return ("夜に", "お疲れ様、", "一日の終わりに")
+    else:
+        return ("こんな時間に", "夜更かしして", "")
+
 class CatherineLearningSystem:
     """Catherine の発言学習システム"""
     
@@ -21,22 +41,68 @@ class CatherineLearningSystem:
                                      catherine_response: str, user_reaction: str):
         """ユーザーの反応を記録して学習データに追加"""
         try:
+            now = datetime.now(JST)
             feedback_data = {
                 'user_id': user_id,
                 'message_type': message_type,  # 'todo_create', 'todo_delete', etc.
                 'catherine_response': catherine_response,
                 'user_reaction': user_reaction,  # 'positive', 'negative', 'neutral'
-                'timestamp': datetime.now(pytz.timezone('Asia/Tokyo')).astimezone(pytz.UTC),
-                'hour': datetime.now(pytz.timezone('Asia/Tokyo')).hour
+                'timestamp': now.astimezone(pytz.UTC),
+                'hour': now.hour
             }
             
-            # Firebaseに保存
-            self.db.collection('catherine_learning').add(feedback_data)
+            # Firebaseに保存（バッチでまとめて書き込み）
+            firestore_batch_writer.add('catherine_learning', feedback_data)
+            
+            # 好評だった返答は種類別の集約ドキュメントにも積む（読み出しは1ドキュメントで済む）
+            if user_reaction == 'positive' and self.db:
+                await asyncio.to_thread(self._merge_learned_responses, message_type, catherine_response)
             logger.info(f"Recorded feedback for {message_type}: {user_reaction}")
             
         except Exception as e:
             logger.error(f"Failed to record feedback: {e}")
     
+    def _merge_learned_responses(self, message_type: str, response: Optional[str] = None) -> List[str]:
+        """
+        好評な返答を集約ドキュメントに追加し、新しいものから上限件数に切り詰める（同期処理）
+        
+        未移行のドキュメントには先に好評ログを取り込む。トランザクション内で読み書きするので
+        同時に追加されても取りこぼさない。
+        
+        Returns:
+            古い順の好評な返答のリスト
+        """
+        doc_ref = self.db.collection('catherine_learned_responses').document(message_type)
+        
+        @firestore.transactional
+        def merge(transaction) -> List[str]:
+            snapshot = doc_ref.get(transaction=transaction)
+            data = snapshot.to_dict() if snapshot.exists else {}
+            responses = list(data.get('responses') or [])
+            
+            if not data.get('migrated'):
+                query = (self.db.collection('catherine_learning')
+                        .where('message_type', '==', message_type)
+                        .where('user_reaction', '==', 'positive')
+                        .limit(LEARNED_RESPONSES_LIMIT))
+                responses = [doc.to_dict()['catherine_response'] for doc in query.get()] + responses
+            
+            if response is not None:
+                responses.append(response)
+            
+            # 重複は一番新しい位置だけ残し、新しい順に上限件数までに絞って古い順へ戻す
+            responses = list(dict.fromkeys(reversed(responses)))[:LEARNED_RESPONSES_LIMIT]
+            responses.reverse()
+            
+            transaction.set(doc_ref, {
+                'responses': responses,
+                'migrated': True,
+                'updated_at': datetime.now(pytz.UTC)
+            })
+            return responses
+        
+        return merge(self.db.transaction())
+    
     async def get_learned_responses(self, message_type: str, hour: int = None) -> List[str]:
         """学習データから最適な返答候補を取得"""
         try:
@@ -61,15 +127,16 @@ class CatherineLearningSystem:
             
             # 学習データがある場合は取得
             if self.db:
-                query = (self.db.collection('catherine_learning')
-                        .where('message_type', '==', message_type)
-                        .where('user_reaction', '==', 'positive')
-                        .limit(10))
-                
-                learned_responses = []
-                for doc in query.stream():
-                    data = doc.to_dict()
-                    learned_responses.append(data['catherine_response'])
+                doc = await asyncio.to_thread(
+                    self.db.collection('catherine_learned_responses').document(message_type).get
+                )
+                data = doc.to_dict() if doc.exists else {}
+                if data.get('migrated'):
+                    learned_responses = data.get('responses') or []
+                else:
+                    # 集約ドキュメントへ移行する前のデータはログから取り込む（次回からは集約ドキュメントだけを読む）
+                    learned_responses = await asyncio.to_thread(self._merge_learned_responses, message_type)
+                learned_responses = learned_responses[-10:]
                 
                 if learned_responses:
                     # 学習した好評な返答を50%の確率で使用
@@ -86,17 +153,10 @@ class CatherineLearningSystem:
     async def generate_adaptive_response(self, message_type: str, context: Dict[str, Any]) -> str:
         """文脈に応じた適応的な返答を生成"""
         try:
-            hour = datetime.now(pytz.timezone('Asia/Tokyo')).hour
+            hour = datetime.now(JST).hour
             
             # 時間帯による調整
-            if 5 <= hour < 10:
-                time_modifier = ["朝から", "早起きして", "今日も"]
-            elif 12 <= hour < 15:
-                time_modifier = ["お昼に", "午後も", ""]
-            elif 18 <= hour < 22:
-                time_modifier = ["夜に", "お疲れ様、", "一日の終わりに"]
-            else:
-                time_modifier = ["こんな時間に", "夜更かしして", ""]
+            time_modifier = _time_modifiers_for_hour(hour)
             
             # 学習した返答を取得
             responses = await self.get_learned_responses(message_type, hour)
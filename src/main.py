@@ -1,5 +1,5 @@
-from collections import defaultdict
-from typing import Literal, Optional, Union, Dict, Any
+from itertools import islice
+from typing import Optional, Dict, Any
 
 import discord
 from discord import Message as DiscordMessage, app_commands
@@ -25,20 +25,18 @@ from src.constants import (
     DISCORD_BOT_TOKEN,
     EXAMPLE_CONVOS,
     ACTIVATE_THREAD_PREFX,
-    MAX_THREAD_MESSAGES,
-    SECONDS_DELAY_RECEIVING_MSG,
     AVAILABLE_MODELS,
     DEFAULT_MODEL,
 )
 import asyncio
+import random
 import pytz
 import uuid
+from datetime import datetime
 from src.utils import (
     logger,
     should_block,
-    close_thread,
-    is_last_message_stale,
-    discord_message_to_message,
+    StreamingReply,
 )
 from src import completion
 from src.completion import generate_completion_response, process_response
@@ -51,12 +49,15 @@ from src.simple_google_service import google_service
 from src.mention_utils import DiscordMentionHandler, get_mention_string
 from src.channel_utils import should_respond_to_message, get_channel_info
 
+# 東京タイムゾーン（呼び出しごとに引かない）
+JST = pytz.timezone('Asia/Tokyo')
+
 intents = discord.Intents.default()
 intents.message_content = True
 
 client = discord.Client(intents=intents)
 tree = discord.app_commands.CommandTree(client)
-thread_data = defaultdict()
+thread_data: dict = {}
 
 # システム初期化フラグ
 _systems_initialized = False
@@ -66,6 +67,21 @@ BOT_INSTANCE_ID = str(uuid.uuid4())[:8]
 # グローバル変数
 notion_integration = None
 mention_handler = None
+# 実行中のバックグラウンドタスク（GCで消えないよう参照を保持）
+_background_tasks = set()
+
+def _log_background_result(task: asyncio.Task):
+    """バックグラウンドタスクの例外をログに残す"""
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
+
+def spawn_background(coro, name: str = None) -> asyncio.Task:
+    """応答を待たせずに副次的な処理（記録・保存など）を走らせる"""
+    task = asyncio.create_task(coro, name=name)
+    _background_tasks.add(task)
+    task.add_done_callback(_log_background_result)
+    return task
 
 # システム初期化用のsetup_hook
 @client.event
@@ -82,7 +98,7 @@ async def setup_hook():
     try:
         # Google Service初期化
         logger.info("Initializing Google Services...")
-        google_initialized = google_service.initialize()
+        google_initialized = await asyncio.to_thread(google_service.initialize)
         if google_initialized:
             logger.info("✅ Google Services initialized successfully")
         else:
@@ -101,6 +117,71 @@ async def setup_hook():
     
     logger.info("Setup hook completed")
 
+# 魔女風の定型メッセージ（呼び出しごとに組み立て直さない）
+WITCH_CREATE_TIPS = [
+    "「リスト」って言えば見せてあげるよ",
+    "よくできました、偉いねぇ",
+    "また一つ増えちゃったね",
+    "ちゃんと覚えておいたからね"
+]
+
+WITCH_LIST_TIPS = [
+    "さあ、今日も頑張るんだよ",
+    "一つずつ片付けていきな",
+    "やることが山積みだねぇ",
+    "無理は禁物だからね"
+]
+
+WITCH_DELETE_FAIL = [
+    "あらら、削除できなかったみたいだねぇ",
+    "やれやれ、うまくいかなかったよ",
+    "おや？何か間違えたようだね",
+    "困ったねぇ、消せなかったよ"
+]
+
+WITCH_UPDATE_FAIL = [
+    "あらら、名前変更に失敗したねぇ",
+    "やれやれ、うまくいかなかったよ",
+    "困ったね、変更できなかったみたい",
+    "おや、何かがおかしいようだね"
+]
+
+WITCH_UPDATE_HELP = [
+    "番号と新しい名前を教えてごらん（例: 1は買い物リストにして）",
+    "どの番号の何を変えたいのか言いな",
+    "番号と新しい名前、両方必要だよ",
+    "何番のタイトルをどう変えるのかい？"
+]
+
+WITCH_URGENT = [
+    "ほら、今すぐやらないとマズいよ！",
+    "急ぎの用事だから、すぐに取り掛かりな",
+    "さあさあ、今すぐ始めるんだよ",
+    "待ったなしだね、頑張りな",
+    "のんびりしてる場合じゃないよ",
+    "急いで、急いで！",
+    "今すぐ片付けちゃいな"
+]
+
+WITCH_HELP_MESSAGES = [
+    "ふむ、何を言ってるのかわからないねぇ...\n\n「〇〇を追加」「リスト」「1番削除」「5は優先度激高に」\nこんな風に言ってごらん。覚えが悪いねぇ",
+    "あらあら、理解できないよ...\n\n「タスクを追加」「一覧見せて」「優先度変更」\nもう少し分かりやすく言いな",
+    "やれやれ、何のことだい？\n\n「TODO追加」「削除」「リマインド設定」\n基本的な使い方を覚えておくれよ",
+    "おや、意味がわからないねぇ...\n\nシンプルに「追加」「削除」「リスト」って言えばいいのに\nまったく、困った子だね"
+]
+
+# 操作結果の後に付けるTODOリストの区切り線
+TODO_LIST_SEPARATOR = "─" * 30
+
+async def append_todo_list(todo_manager, response: str, empty_message: Optional[str] = None) -> str:
+    """操作後の未完了TODOリストを返答に付け足す（空ならempty_messageを付ける）"""
+    todos = await todo_manager.get_todos(include_completed=False)
+    if todos:
+        return f"{response}\n\n{TODO_LIST_SEPARATOR}\n{todo_manager.format_todo_list(todos)}"
+    if empty_message:
+        return f"{response}\n\n{empty_message}"
+    return response
+
 # Handle TODO commands
 async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str:
     """TODO操作を処理"""
@@ -128,7 +209,7 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
             })
             
             if todo.get('due_date'):
-                due_date_jst = todo['due_date'].astimezone(pytz.timezone('Asia/Tokyo'))
+                due_date_jst = todo['due_date'].astimezone(JST)
                 response += f"\n📅 期限: {due_date_jst.strftime('%Y-%m-%d %H:%M')}"
                 
             # 学習システムから適応的な返答を取得
@@ -140,20 +221,10 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
                 response += "\n\n" + adaptive_response
             except Exception as e:
                 # フォールバック
-                witch_create_tips = [
-                    "「リスト」って言えば見せてあげるよ",
-                    "よくできました、偉いねぇ",
-                    "また一つ増えちゃったね",
-                    "ちゃんと覚えておいたからね"
-                ]
-                import random
-                response += "\n\n" + random.choice(witch_create_tips)
+                response += "\n\n" + random.choice(WITCH_CREATE_TIPS)
             
             # TODO作成後に自動でチーム全体のリストを表示
-            todos = await todo_manager.get_todos(include_completed=False)
-            if todos:
-                response += "\n\n" + "─" * 30 + "\n"
-                response += todo_manager.format_todo_list(todos)
+            response = await append_todo_list(todo_manager, response)
             
         elif action == 'list':
             # TODOリスト表示（チーム全体）
@@ -175,14 +246,7 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
                     response += "\n" + adaptive_tip
                 except Exception as e:
                     # フォールバック
-                    witch_tips = [
-                        "さあ、今日も頑張るんだよ",
-                        "一つずつ片付けていきな",
-                        "やることが山積みだねぇ",
-                        "無理は禁物だからね"
-                    ]
-                    import random
-                    response += "\n" + random.choice(witch_tips)
+                    response += "\n" + random.choice(WITCH_LIST_TIPS)
             
         elif action == 'complete':
             # TODO完了（チーム全体）
@@ -195,12 +259,7 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
                     response = witch_personality.enhance_todo_response('complete', {'title': todo['title']})
                     
                     # 完了後に自動でリストを表示
-                    remaining_todos = await todo_manager.get_todos(include_completed=False)
-                    if remaining_todos:
-                        response += "\n\n" + "─" * 30 + "\n"
-                        response += todo_manager.format_todo_list(remaining_todos)
-                    else:
-                        response += "\n\nあらあら、全部完了したのかい？偉いねぇ"
+                    response = await append_todo_list(todo_manager, response, "あらあら、全部完了したのかい？偉いねぇ")
                 else:
                     response = "あらら、完了にできなかったみたいだねぇ..."
             else:
@@ -219,27 +278,14 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
                         f"あらあら、{result['deleted_count']}個も削除ね\n{deleted_titles}\n\n思い切りがいいじゃないか",
                         f"やれやれ、{result['deleted_count']}個も消すの？\n{deleted_titles}\n\n後悔しないようにね"
                     ]
-                    import random
                     response = random.choice(witch_multi_delete)
                     if result.get('failed_numbers'):
                         response += f"\nでも番号 {result['failed_numbers']} は消せなかったよ"
                     
                     # 複数削除後に自動でリストを表示
-                    remaining_todos = await todo_manager.get_todos(include_completed=False)
-                    if remaining_todos:
-                        response += "\n\n" + "─" * 30 + "\n"
-                        response += todo_manager.format_todo_list(remaining_todos)
-                    else:
-                        response += "\n\nあらあら、全部なくなったじゃないか"
+                    response = await append_todo_list(todo_manager, response, "あらあら、全部なくなったじゃないか")
                 else:
-                    witch_delete_fail = [
-                        "あらら、削除できなかったみたいだねぇ",
-                        "やれやれ、うまくいかなかったよ",
-                        "おや？何か間違えたようだね",
-                        "困ったねぇ、消せなかったよ"
-                    ]
-                    import random
-                    response = f"{random.choice(witch_delete_fail)}\\n{result.get('message', '')}"
+                    response = f"{random.choice(WITCH_DELETE_FAIL)}\\n{result.get('message', '')}"
             else:
                 # 単一削除（従来の処理）
                 todos = await todo_manager.get_todos(include_completed=True)
@@ -251,12 +297,7 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
                         response = witch_personality.enhance_todo_response('delete', {'title': todo['title']})
                         
                         # 単一削除後に自動でリストを表示
-                        remaining_todos = await todo_manager.get_todos(include_completed=False)
-                        if remaining_todos:
-                            response += "\n\n" + "─" * 30 + "\n"
-                            response += todo_manager.format_todo_list(remaining_todos)
-                        else:
-                            response += "\n\nあらあら、全部なくなったじゃないか"
+                        response = await append_todo_list(todo_manager, response, "あらあら、全部なくなったじゃないか")
                     else:
                         response = "やれやれ、削除できなかったよ。困ったねぇ"
                 else:
@@ -282,10 +323,7 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
                     response = f"ふむ、優先度を変えるのかい？\n{icon} {result['message']}\n\n📋 リストは自動的に優先度順に並び替えられるよ。激高が一番上にくるからね"
                     
                     # 優先度変更後に自動でリストを表示
-                    todos = await todo_manager.get_todos(include_completed=False)
-                    if todos:
-                        response += "\n\n" + "─" * 30 + "\n"
-                        response += todo_manager.format_todo_list(todos)
+                    response = await append_todo_list(todo_manager, response)
                 else:
                     response = f"あらら、{result.get('message', '優先度を変更できなかったねぇ')}"
             else:
@@ -306,32 +344,14 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
                         f"タイトルを変えたね\n「{result['old_title']}」→「{result['new_title']}」\n\n新しい名前の方がマシかい？",
                         f"リネーム完了さ\n「{result['old_title']}」→「{result['new_title']}」\n\nころころ変えるもんじゃないよ？"
                     ]
-                    import random
                     response = random.choice(witch_rename)
                     
                     # タイトル変更後に自動でリストを表示
-                    todos = await todo_manager.get_todos(include_completed=False)
-                    if todos:
-                        response += "\n\n" + "─" * 30 + "\n"
-                        response += todo_manager.format_todo_list(todos)
+                    response = await append_todo_list(todo_manager, response)
                 else:
-                    witch_update_fail = [
-                        "あらら、名前変更に失敗したねぇ",
-                        "やれやれ、うまくいかなかったよ",
-                        "困ったね、変更できなかったみたい",
-                        "おや、何かがおかしいようだね"
-                    ]
-                    import random
-                    response = f"{random.choice(witch_update_fail)}\\n{result.get('message', 'TODOの更新に失敗しました')}"
+                    response = f"{random.choice(WITCH_UPDATE_FAIL)}\\n{result.get('message', 'TODOの更新に失敗しました')}"
             else:
-                witch_update_help = [
-                    "番号と新しい名前を教えてごらん（例: 1は買い物リストにして）",
-                    "どの番号の何を変えたいのか言いな",
-                    "番号と新しい名前、両方必要だよ",
-                    "何番のタイトルをどう変えるのかい？"
-                ]
-                import random
-                response = random.choice(witch_update_help)
+                response = random.choice(WITCH_UPDATE_HELP)
         
         elif action == 'remind':
             # リマインダー設定
@@ -358,7 +378,7 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
                         )
                         
                         # JSTで表示
-                        time_jst = remind_time.astimezone(pytz.timezone('Asia/Tokyo'))
+                        time_jst = remind_time.astimezone(JST)
                         time_str = time_jst.strftime('%Y-%m-%d %H:%M JST')
                         mention_str = f'@{intent.get("mention_target", "everyone")}'
                         channel_str = f'#{intent.get("channel_target", "todo")}チャンネル'
@@ -394,7 +414,7 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
                         )
                         
                         # JSTで表示
-                        time_jst = remind_time.astimezone(pytz.timezone('Asia/Tokyo'))
+                        time_jst = remind_time.astimezone(JST)
                         time_str = time_jst.strftime('%Y-%m-%d %H:%M JST')
                         mention_str = f'@{intent.get("mention_target", "everyone")}'
                         channel_str = f'#{intent.get("channel_target", "todo")}チャンネル'
@@ -425,11 +445,12 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
                             # チャンネルを取得
                             channel_name = result.get('channel_target', 'todo')
                             channel = None
+                            channel_name_lower = channel_name.lower()
                             
                             # チャンネルを検索
                             for guild in client.guilds:
                                 for ch in guild.channels:
-                                    if ch.name.lower() == channel_name.lower() and hasattr(ch, 'send'):
+                                    if ch.name.lower() == channel_name_lower and hasattr(ch, 'send'):
                                         channel = ch
                                         break
                                 if channel:
@@ -447,17 +468,7 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
                                     mention = get_mention_string(mention_target, channel.guild, client)
                                 
                                 # リマインダーメッセージを送信
-                                witch_urgent = [
-                                    "ほら、今すぐやらないとマズいよ！",
-                                    "急ぎの用事だから、すぐに取り掛かりな",
-                                    "さあさあ、今すぐ始めるんだよ",
-                                    "待ったなしだね、頑張りな",
-                                    "のんびりしてる場合じゃないよ",
-                                    "急いで、急いで！",
-                                    "今すぐ片付けちゃいな"
-                                ]
-                                import random
-                                urgent_comment = random.choice(witch_urgent)
+                                urgent_comment = random.choice(WITCH_URGENT)
                                 await channel.send(f"{mention}\n{result.get('todo_title', 'TODO')}\n{urgent_comment}")
                             else:
                                 logger.error(f"Channel '{channel_name}' not found")
@@ -492,14 +503,7 @@ async def handle_todo_command(user: discord.User, intent: Dict[str, Any]) -> str
                 response = "❌ 番号を指定してください（例: 1を明日リマインド）"
         
         else:
-            witch_help_messages = [
-                "ふむ、何を言ってるのかわからないねぇ...\n\n「〇〇を追加」「リスト」「1番削除」「5は優先度激高に」\nこんな風に言ってごらん。覚えが悪いねぇ",
-                "あらあら、理解できないよ...\n\n「タスクを追加」「一覧見せて」「優先度変更」\nもう少し分かりやすく言いな",
-                "やれやれ、何のことだい？\n\n「TODO追加」「削除」「リマインド設定」\n基本的な使い方を覚えておくれよ",
-                "おや、意味がわからないねぇ...\n\nシンプルに「追加」「削除」「リスト」って言えばいいのに\nまったく、困った子だね"
-            ]
-            import random
-            response = random.choice(witch_help_messages)
+            response = random.choice(WITCH_HELP_MESSAGES)
             
     except Exception as e:
         logger.error(f"TODO operation error: {e}")
@@ -515,21 +519,19 @@ async def save_conversation_to_firebase(user_id: str, channel_id: str, message:
         return
     
     try:
-        from datetime import datetime
-        import pytz
+        from firebase_config import firestore_batch_writer
         
-        db = firebase_manager.get_db()
         conversation_data = {
             'user_id': user_id,
             'channel_id': channel_id,
             'user_message': message,
             'bot_response': response,
-            'timestamp': datetime.now(pytz.timezone('Asia/Tokyo')).astimezone(pytz.UTC).isoformat(),
+            'timestamp': datetime.now(pytz.UTC).isoformat(),
             'message_type': 'chat_completion'
         }
         
-        # Save to Firebase
-        db.collection('conversations').add(conversation_data)
+        # Save to Firebase (coalesced into a WriteBatch)
+        firestore_batch_writer.add('conversations', conversation_data)
         logging.info(f"Conversation saved to Firebase for user {user_id}")
         
     except Exception as e:
@@ -558,13 +560,17 @@ async def on_ready():
         
         # Also sync to specific guilds if needed
         from src.constants import ALLOWED_SERVER_IDS
-        for guild_id in ALLOWED_SERVER_IDS:
-            try:
-                guild = discord.Object(id=guild_id)
-                guild_commands = await tree.sync(guild=guild)
+        # ギルドごとの同期は互いに独立しているので並行して投げる
+        guild_ids = list(ALLOWED_SERVER_IDS)
+        guild_results = await asyncio.gather(
+            *(tree.sync(guild=discord.Object(id=guild_id)) for guild_id in guild_ids),
+            return_exceptions=True,
+        )
+        for guild_id, guild_commands in zip(guild_ids, guild_results):
+            if isinstance(guild_commands, Exception):
+                logger.error(f"Failed to sync commands to guild {guild_id}: {guild_commands}")
+            else:
                 logger.info(f"Synced {len(guild_commands)} command(s) to guild {guild_id}")
-            except Exception as guild_error:
-                logger.error(f"Failed to sync commands to guild {guild_id}: {guild_error}")
                 
     except Exception as e:
         logger.error(f"Failed to sync commands: {e}")
@@ -624,7 +630,7 @@ async def chat_command(
 
         try:
             # moderate the message
-            flagged_str, blocked_str = moderate_message(message=message, user=user)
+            flagged_str, blocked_str = await moderate_message(message=message, user=user)
             await send_moderation_blocked_message(
                 guild=interaction.guild,
                 user=user,
@@ -723,15 +729,20 @@ async def on_message(message: DiscordMessage):
         try:
             from src.unified_message_handler import unified_handler
             
+            # 生成途中の返答をメッセージ編集で逐次表示
+            streaming_reply = StreamingReply(message)
             async with message.channel.typing():
-                response = await unified_handler.handle_message(message)
+                response = await unified_handler.handle_message(message, on_partial=streaming_reply.update)
             
             if response:
-                await message.reply(response)
+                await streaming_reply.finish(response)
                 
-                # 会話をFirebaseに保存
+                # 会話をFirebaseに保存（応答を待たせないようバックグラウンドで）
                 if _systems_initialized and FIREBASE_ENABLED:
-                    await save_conversation_to_firebase(str(user.id), str(message.channel.id), content, response)
+                    spawn_background(
+                        save_conversation_to_firebase(str(user.id), str(message.channel.id), content, response),
+                        name="save_conversation"
+                    )
                 
                 logger.info("Message processed successfully by unified handler")
                 return
@@ -759,12 +770,12 @@ def format_google_response(result: dict, action: str) -> str:
             count = result.get('count', 0)
             emails = result.get('emails', [])
             if count > 0:
-                response = f"ふふ、メールが{count}通あるよ\n\n"
-                for i, email in enumerate(emails[:3], 1):
-                    response += f"{i}. **{email['subject']}**\n   From: {email['from']}\n   {email['snippet']}\n\n"
+                parts = [f"ふふ、メールが{count}通あるよ\n\n"]
+                for i, email in enumerate(islice(emails, 3), 1):
+                    parts.append(f"{i}. **{email['subject']}**\n   From: {email['from']}\n   {email['snippet']}\n\n")
                 if count > 3:
-                    response += f"...他{count-3}通あるよ"
-                return response
+                    parts.append(f"...他{count-3}通あるよ")
+                return "".join(parts)
             else:
                 return "あら、新しいメールはないようだね"
                 
@@ -12,7 +12,7 @@ from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class MCPServer:
     """MCPサーバーの設定"""
     name: str
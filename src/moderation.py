@@ -5,18 +5,19 @@ from src.constants import (
     MODERATION_VALUES_FOR_BLOCKED,
     MODERATION_VALUES_FOR_FLAGGED,
 )
-from openai import OpenAI
+from src.openai_client import openai_client
 
-client = OpenAI()
+# 非同期クライアントでイベントループを塞がない（接続プールは他モジュールと共有）
+client = openai_client
 from typing import Optional, Tuple
 import discord
 from src.utils import logger
 
 
-def moderate_message(
+async def moderate_message(
     message: str, user: str
 ) -> Tuple[str, str]:  # [flagged_str, blocked_str]
-    moderation_response = client.moderations.create(
+    moderation_response = await client.moderations.create(
         input=message, model="text-moderation-latest"
     )
     category_scores = moderation_response.results[0].category_scores or {}
@@ -2,12 +2,26 @@
 Notion連携機能 - Catherine用
 MCPブリッジ経由でNotionを操作
 """
-import json
 import logging
 from typing import Dict, List, Optional, Any
 
 logger = logging.getLogger(__name__)
 
+# 一覧表示用アイコン
+_PRIORITY_ICONS = {
+    'urgent': '⚫',   # 激高
+    'high': '🔴',     # 高
+    'normal': '🟡',   # 普通
+    'low': '🟢'       # 低い
+}
+
+_STATUS_ICONS = {
+    'pending': '⏳',
+    'in_progress': '🔄',
+    'completed': '✅',
+    'cancelled': '❌'
+}
+
 class NotionIntegration:
     """Catherine用Notion連携"""
     
@@ -154,47 +168,34 @@ class NotionIntegration:
         if not todos:
             return "📝 NotionのTODOリストは空です。"
         
-        priority_icons = {
-            'urgent': '⚫',   # 激高
-            'high': '🔴',     # 高
-            'normal': '🟡',   # 普通
-            'low': '🟢'       # 低い
-        }
-        
-        status_icons = {
-            'pending': '⏳',
-            'in_progress': '🔄',
-            'completed': '✅',
-            'cancelled': '❌'
-        }
-        
-        formatted = f"📋 **Notion TODOs** ({len(todos)}件)\n\n"
+        parts = [f"📋 **Notion TODOs** ({len(todos)}件)\n\n"]
         
-        for i, todo in enumerate(todos, 1):
-            priority = todo.get('priority', 'normal')
-            status = todo.get('status', 'pending')
+        for todo in todos:
+            priority_icon = _PRIORITY_ICONS.get(todo.get('priority', 'normal'), '🟡')
+            status_icon = _STATUS_ICONS.get(todo.get('status', 'pending'), '⏳')
             
-            priority_icon = priority_icons.get(priority, '🟡')
-            status_icon = status_icons.get(status, '⏳')
+            parts.append(f"{priority_icon} {status_icon} **{todo['title']}**\n")
             
-            formatted += f"{priority_icon} {status_icon} **{todo['title']}**\n"
-            
-            if todo.get('due_date'):
-                formatted += f"   📅 期限: {todo['due_date']}\n"
+            # 各フィールドは1回だけ引く
+            due_date = todo.get('due_date')
+            if due_date:
+                parts.append(f"   📅 期限: {due_date}\n")
             
-            if todo.get('created_by'):
-                formatted += f"   👤 作成者: {todo['created_by']}\n"
+            created_by = todo.get('created_by')
+            if created_by:
+                parts.append(f"   👤 作成者: {created_by}\n")
             
-            if todo.get('tags'):
-                tags_str = ", ".join(todo['tags'])
-                formatted += f"   🏷️ タグ: {tags_str}\n"
+            tags = todo.get('tags')
+            if tags:
+                parts.append(f"   🏷️ タグ: {', '.join(tags)}\n")
             
-            if todo.get('url'):
-                formatted += f"   🔗 [Notionで開く]({todo['url']})\n"
+            url = todo.get('url')
+            if url:
+                parts.append(f"   🔗 [Notionで開く]({url})\n")
             
-            formatted += "\n"
+            parts.append("\n")
         
-        return formatted
+        return "".join(parts)
     
     async def create_reminder_record(self, reminder_id: str, message: str, 
                                    calendar_event_id: str, remind_time: str,
@@ -0,0 +1,63 @@
+"""
+OpenAI APIクライアント - 全モジュールで1つの接続プールを共有する
+"""
+import asyncio
+import os
+import time
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+# h2 が入っていればHTTP/2で1本の接続に多重化する
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 同時接続数と使い回す接続数の上限
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '100'))
+OPENAI_MAX_KEEPALIVE = int(os.getenv('OPENAI_MAX_KEEPALIVE', '20'))
+# 1分あたりのリクエスト数の上限（0なら制限しない）
+OPENAI_MAX_RPM = int(os.getenv('OPENAI_MAX_RPM', '0'))
+
+
+class RequestRateLimiter:
+    """リクエスト間隔を平準化するトークンバケット（429での再試行の連鎖を防ぐ）"""
+
+    def __init__(self, requests_per_minute: int):
+        self.rate = requests_per_minute / 60.0
+        # 瞬間的なバーストは1分枠の1/10まで
+        self.capacity = max(1.0, requests_per_minute / 10)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """1リクエスト分の枠が空くまで待つ"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# グローバルインスタンス（SDK側で指数バックオフ付き再試行）
+openai_client = AsyncOpenAI(
+    api_key=os.getenv('OPENAI_API_KEY') or os.getenv('OPENAI_KEY'),
+    max_retries=3,
+    http_client=DefaultAsyncHttpxClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+        ),
+    ),
+)
+openai_rate_limiter = RequestRateLimiter(OPENAI_MAX_RPM)
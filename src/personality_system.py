@@ -2,7 +2,58 @@
 Catherine パーソナリティシステム - 荒れ地の魔女風
 """
 import random
-from typing import Dict, Any, List
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Any
+import pytz
+
+# 東京タイムゾーン（呼び出しごとに引かない）
+JST = pytz.timezone('Asia/Tokyo')
+
+# 時間帯ごとの挨拶候補（開始時, 終了時, 候補）
+_TIME_GREETINGS = (
+    (5, 10, (
+        "おや、早起きだねぇ。感心感心",
+        "朝から元気そうで何より",
+        "ふふ、今日も一日頑張るんだよ"
+    )),
+    (10, 12, (
+        "もうこんな時間かい。時間は早いねぇ",
+        "午前中も半分過ぎたよ。調子はどうだい？"
+    )),
+    (12, 15, (
+        "お昼は食べたかい？ちゃんと食べないとダメだよ",
+        "午後も頑張るんだよ",
+        "昼下がりは眠くなるねぇ..."
+    )),
+    (15, 18, (
+        "もう夕方だよ。今日の仕事は進んでるかい？",
+        "あと少しで一日が終わるね"
+    )),
+    (18, 21, (
+        "夜になったねぇ。そろそろ休む準備かい？",
+        "晩ご飯は食べたかい？",
+        "夜は無理しちゃダメだよ"
+    )),
+)
+_LATE_NIGHT_GREETINGS = (
+    "こんな時間まで起きてるのかい？体に悪いよ",
+    "やれやれ、夜更かしさんだねぇ",
+    "ふふ、眠れないのかい？"
+)
+
+@lru_cache(maxsize=24)
+def _greetings_for_hour(hour: int) -> tuple:
+    """その時刻の挨拶候補（時刻ごとに1回だけ判定）"""
+    for start, end, greetings in _TIME_GREETINGS:
+        if start <= hour < end:
+            return greetings
+    return _LATE_NIGHT_GREETINGS
+
+class _KeepMissing(dict):
+    """format_map用: 渡されなかったプレースホルダーはそのまま残す"""
+    def __missing__(self, key):
+        return '{' + key + '}'
 
 class WitchPersonality:
     """荒れ地の魔女風のパーソナリティ"""
@@ -99,11 +150,8 @@ class WitchPersonality:
         # パターンからランダムに選択
         pattern = random.choice(cls.SPEECH_PATTERNS[response_type])
         
-        # プレースホルダーを置換
-        for key, value in kwargs.items():
-            pattern = pattern.replace(f'{{{key}}}', str(value))
-        
-        return pattern
+        # プレースホルダーを置換（テンプレートは1回の走査で展開）
+        return pattern.format_map(_KeepMissing(kwargs))
     
     @classmethod
     def _add_witch_tone(cls, text: str) -> str:
@@ -179,46 +227,7 @@ class WitchPersonality:
     @classmethod
     def get_time_greeting(cls) -> str:
         """時間帯に応じた挨拶"""
-        from datetime import datetime
-        import pytz
-        
-        now = datetime.now(pytz.timezone('Asia/Tokyo'))
-        hour = now.hour
-        
-        if 5 <= hour < 10:
-            return random.choice([
-                "おや、早起きだねぇ。感心感心",
-                "朝から元気そうで何より",
-                "ふふ、今日も一日頑張るんだよ"
-            ])
-        elif 10 <= hour < 12:
-            return random.choice([
-                "もうこんな時間かい。時間は早いねぇ",
-                "午前中も半分過ぎたよ。調子はどうだい？"
-            ])
-        elif 12 <= hour < 15:
-            return random.choice([
-                "お昼は食べたかい？ちゃんと食べないとダメだよ",
-                "午後も頑張るんだよ",
-                "昼下がりは眠くなるねぇ..."
-            ])
-        elif 15 <= hour < 18:
-            return random.choice([
-                "もう夕方だよ。今日の仕事は進んでるかい？",
-                "あと少しで一日が終わるね"
-            ])
-        elif 18 <= hour < 21:
-            return random.choice([
-                "夜になったねぇ。そろそろ休む準備かい？",
-                "晩ご飯は食べたかい？",
-                "夜は無理しちゃダメだよ"
-            ])
-        else:
-            return random.choice([
-                "こんな時間まで起きてるのかい？体に悪いよ",
-                "やれやれ、夜更かしさんだねぇ",
-                "ふふ、眠れないのかい？"
-            ])
+        return random.choice(_greetings_for_hour(datetime.now(JST).hour))
 
 # グローバルインスタンス
 witch_personality = WitchPersonality()
\ No newline at end of file
@@ -2,13 +2,13 @@
 シンプルなBot - 基本機能のみ
 """
 
+import asyncio
 import discord
-from discord import Message as DiscordMessage
+from discord import Message as DiscordMessage, app_commands
 import logging
 import os
+import re
 import sys
-from datetime import datetime
-import pytz
 
 # 設定
 logging.basicConfig(
@@ -21,16 +21,58 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.constants import DISCORD_BOT_TOKEN, ALLOWED_SERVER_IDS
 from src.simple_google_service import google_service
-from src.channel_utils import should_respond_to_message, get_channel_info
+from src.channel_utils import should_respond_to_message, is_allowed_channel
 
 # Discord設定
 intents = discord.Intents.default()
 intents.message_content = True
 client = discord.Client(intents=intents)
+tree = app_commands.CommandTree(client)
 
 # グローバル変数
 google_initialized = False
 
+# コマンド判定用パターン（小文字化済みの本文に対して使う）
+TASK_LIST_PATTERN = re.compile('|'.join(map(re.escape, ['リスト', '一覧', '全', 'list', 'タスク', 'やること'])))
+EMAIL_PATTERN = re.compile('|'.join(map(re.escape, ['メール', 'mail', 'gmail', 'email'])))
+GREETINGS = frozenset(['よう', 'hello', 'hi', 'こんにちは', 'おはよう'])
+
+# 定型の案内文
+GREETING_HELP_TEXT = "よう！何か手伝おうか？\n\n使い方:\n- 「リスト」→ タスク一覧\n- 「メール」→ メール確認"
+DEFAULT_HELP_TEXT = "何か手伝おうか？\n\n・「リスト」でタスク一覧\n・「メール」でメール確認\n・「○○をタスクに追加」でタスク作成"
+ADD_TASK_HINT_TEXT = "タスクの内容を教えて！（例：「会議準備をタスクに追加」）"
+COMMAND_NOT_ALLOWED_TEXT = "ここではそのコマンドは使えないよ"
+
+# スラッシュコマンドはGmail・Googleタスクに触れるので、DMからの実行は受け付けない
+# （許可サーバーの許可チャンネルからのみ）
+ALLOW_DM_COMMANDS = False
+
+async def _sync_guild_commands(guild_id: int):
+    """グローバル定義のコマンドをギルドへコピーしてから同期"""
+    guild = discord.Object(id=guild_id)
+    # コピーしないとギルド同期の対象が空になる
+    tree.copy_global_to(guild=guild)
+    return await tree.sync(guild=guild)
+
+async def sync_commands():
+    """スラッシュコマンドを許可サーバーへ同期（未設定ならグローバル同期）"""
+    if not ALLOWED_SERVER_IDS:
+        synced = await tree.sync()
+        logger.info(f"Synced {len(synced)} global command(s)")
+        return
+    
+    # ギルドごとの同期は互いに独立しているので並行して投げる
+    guild_ids = list(ALLOWED_SERVER_IDS)
+    results = await asyncio.gather(
+        *(_sync_guild_commands(guild_id) for guild_id in guild_ids),
+        return_exceptions=True,
+    )
+    for guild_id, synced in zip(guild_ids, results):
+        if isinstance(synced, Exception):
+            logger.error(f"Failed to sync commands to guild {guild_id}: {synced}")
+        else:
+            logger.info(f"Synced {len(synced)} command(s) to guild {guild_id}")
+
 @client.event
 async def on_ready():
     """Bot起動時"""
@@ -40,7 +82,7 @@ async def on_ready():
     
     # Google Service初期化
     try:
-        google_initialized = google_service.initialize()
+        google_initialized = await asyncio.to_thread(google_service.initialize)
         if google_initialized:
             logger.info("✅ Google Services ready")
         else:
@@ -48,6 +90,12 @@ async def on_ready():
     except Exception as e:
         logger.error(f"Google initialization error: {e}")
     
+    # スラッシュコマンドを同期（コマンドはDiscord側でルーティングされる）
+    try:
+        await sync_commands()
+    except Exception as e:
+        logger.error(f"Failed to sync commands: {e}")
+    
     logger.info("🚀 Bot ready to respond!")
 
 @client.event
@@ -75,14 +123,14 @@ async def on_message(message: DiscordMessage):
         response = None
         
         # 基本的なコマンド処理
-        if any(word in content for word in ['リスト', '一覧', '全', 'list', 'タスク', 'やること']):
+        if TASK_LIST_PATTERN.search(content):
             response = await handle_task_list()
         
-        elif any(word in content for word in ['メール', 'mail', 'gmail', 'email']):
+        elif EMAIL_PATTERN.search(content):
             response = await handle_email_check()
         
-        elif content in ['よう', 'hello', 'hi', 'こんにちは', 'おはよう']:
-            response = "よう！何か手伝おうか？\n\n使い方:\n- 「リスト」→ タスク一覧\n- 「メール」→ メール確認"
+        elif content in GREETINGS:
+            response = GREETING_HELP_TEXT
         
         elif '追加' in content and 'タスク' in content:
             # タスク追加処理
@@ -90,10 +138,10 @@ async def on_message(message: DiscordMessage):
             if task_text:
                 response = await handle_task_create(task_text)
             else:
-                response = "タスクの内容を教えて！（例：「会議準備をタスクに追加」）"
+                response = ADD_TASK_HINT_TEXT
         
         else:
-            response = "何か手伝おうか？\n\n・「リスト」でタスク一覧\n・「メール」でメール確認\n・「○○をタスクに追加」でタスク作成"
+            response = DEFAULT_HELP_TEXT
         
         # 応答送信
         if response:
@@ -110,19 +158,20 @@ async def handle_task_list():
         if not google_initialized:
             return "⚠️ Google Tasksに接続できません"
         
-        tasks = google_service.get_tasks()
+        # Google APIクライアントは同期なのでイベントループ外で実行
+        tasks = await asyncio.to_thread(google_service.get_tasks)
         
         if not tasks:
             return "📋 現在のタスクはありません"
         
-        response = "📋 **現在のタスク一覧**\n\n"
+        parts = ["📋 **現在のタスク一覧**\n\n"]
         for i, task in enumerate(tasks, 1):
-            response += f"{i}. **{task['title']}**\n"
+            parts.append(f"{i}. **{task['title']}**\n")
             if task['notes']:
-                response += f"   {task['notes']}\n"
-            response += "\n"
+                parts.append(f"   {task['notes']}\n")
+            parts.append("\n")
         
-        return response
+        return "".join(parts)
         
     except Exception as e:
         logger.error(f"Task list error: {e}")
@@ -134,18 +183,20 @@ async def handle_email_check():
         if not google_initialized:
             return "⚠️ Gmailに接続できません"
         
-        emails = google_service.get_unread_emails()
+        emails = await asyncio.to_thread(google_service.get_unread_emails)
         
         if not emails:
             return "📧 未読メールはありません"
         
-        response = f"📧 **未読メール ({len(emails)}件)**\n\n"
+        parts = [f"📧 **未読メール ({len(emails)}件)**\n\n"]
         for i, email in enumerate(emails, 1):
-            response += f"{i}. **{email['subject']}**\n"
-            response += f"   From: {email['from']}\n"
-            response += f"   {email['snippet'][:100]}...\n\n"
+            parts.append(
+                f"{i}. **{email['subject']}**\n"
+                f"   From: {email['from']}\n"
+                f"   {email['snippet'][:100]}...\n\n"
+            )
         
-        return response
+        return "".join(parts)
         
     except Exception as e:
         logger.error(f"Email check error: {e}")
@@ -157,7 +208,7 @@ async def handle_task_create(task_text):
         if not google_initialized:
             return "⚠️ Google Tasksに接続できません"
         
-        success = google_service.create_task(task_text)
+        success = await asyncio.to_thread(google_service.create_task, task_text)
         
         if success:
             return f"✅ タスクを作成しました：「{task_text}」"
@@ -168,6 +219,44 @@ async def handle_task_create(task_text):
         logger.error(f"Task create error: {e}")
         return "タスク作成に失敗しました"
 
+def _interaction_allowed(interaction: discord.Interaction) -> bool:
+    """許可サーバーの許可チャンネル（ALLOW_DM_COMMANDS時はDMも）からのコマンドかチェック"""
+    if interaction.guild_id is None:
+        return ALLOW_DM_COMMANDS
+    if interaction.guild_id not in ALLOWED_SERVER_IDS:
+        return False
+    # チャンネル判定はon_messageと同じ基準（判定に使うのは .channel だけ）
+    return is_allowed_channel(interaction)
+
+async def _reject_disallowed(interaction: discord.Interaction) -> bool:
+    """許可されていなければ本人にだけ断りを返してTrue（無応答だとDiscord側でエラー表示になる）"""
+    if _interaction_allowed(interaction):
+        return False
+    await interaction.response.send_message(COMMAND_NOT_ALLOWED_TEXT, ephemeral=True)
+    return True
+
+@tree.command(name="tasks", description="タスク一覧を表示")
+async def tasks_command(interaction: discord.Interaction):
+    if await _reject_disallowed(interaction):
+        return
+    await interaction.response.defer()
+    await interaction.followup.send(await handle_task_list())
+
+@tree.command(name="mail", description="未読メールを確認")
+async def mail_command(interaction: discord.Interaction):
+    if await _reject_disallowed(interaction):
+        return
+    await interaction.response.defer()
+    await interaction.followup.send(await handle_email_check())
+
+@tree.command(name="addtask", description="タスクを追加")
+@app_commands.describe(title="追加するタスクの内容")
+async def addtask_command(interaction: discord.Interaction, title: str):
+    if await _reject_disallowed(interaction):
+        return
+    await interaction.response.defer()
+    await interaction.followup.send(await handle_task_create(title.strip()))
+
 if __name__ == "__main__":
     logger.info("🚀 Starting simple Catherine bot...")
     client.run(DISCORD_BOT_TOKEN)
\ No newline at end of file
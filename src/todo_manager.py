@@ -1,6 +1,7 @@
 """
 TODO管理システム - AI秘書Catherine用
 """
+import asyncio
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Any
 import pytz
@@ -10,9 +11,24 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from firebase_config import firebase_manager
 from google.cloud.firestore_v1.base_query import FieldFilter
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# 東京タイムゾーン（呼び出しごとに引かない）
+JST = pytz.timezone('Asia/Tokyo')
+
+# 優先度アイコン定義（激高、高、普通、低）
+PRIORITY_ICONS = {
+    'urgent': '⚫',   # 激高
+    'high': '🔴',     # 高
+    'normal': '🟡',   # 普通
+    'low': '🟢'       # 低い
+}
+
+# 1回のメッセージ処理内でのTODO一覧の再取得を避けるための短いTTL（秒）
+TODO_LIST_CACHE_TTL = 5
+
 class TodoManager:
     """TODO管理クラス"""
     
@@ -20,17 +36,24 @@ class TodoManager:
         self.db = firebase_manager.get_db()
         if not self.db:
             logger.error("Firebase not available for TodoManager")
+        # (status, include_completed) -> (TODOリスト, 取得時刻)
+        self._todos_cache: Dict[tuple, tuple] = {}
+    
+    def _invalidate_todos_cache(self):
+        """TODOを変更したら一覧キャッシュを破棄"""
+        self._todos_cache.clear()
     
     async def create_todo(self, user_id: str, title: str, description: str = "", 
                          due_date: Optional[datetime] = None, priority: str = "normal") -> Dict[str, Any]:
         """TODOを作成（チーム共有）"""
         try:
+            now = datetime.now(pytz.UTC)
             todo_data = {
                 'created_by': user_id,  # 作成者として記録
                 'title': title,
                 'description': description,
-                'created_at': datetime.now(pytz.timezone('Asia/Tokyo')).astimezone(pytz.UTC),
-                'updated_at': datetime.now(pytz.timezone('Asia/Tokyo')).astimezone(pytz.UTC),
+                'created_at': now,
+                'updated_at': now,
                 'due_date': due_date,
                 'priority': priority,  # low, normal, high, urgent
                 'status': 'pending',  # pending, in_progress, completed, cancelled
@@ -39,8 +62,9 @@ class TodoManager:
                 'tags': []
             }
             
-            # Firestoreに保存
-            doc_ref = self.db.collection('todos').add(todo_data)
+            # Firestoreに保存（同期SDKなのでイベントループ外で実行）
+            doc_ref = await asyncio.to_thread(self.db.collection('todos').add, todo_data)
+            self._invalidate_todos_cache()
             todo_id = doc_ref[1].id
             
             logger.info(f"Created TODO {todo_id} for user {user_id}: {title}")
@@ -54,6 +78,12 @@ class TodoManager:
                         include_completed: bool = False) -> List[Dict[str, Any]]:
         """チーム全体のTODOリストを取得（優先度順にソート）"""
         try:
+            cache_key = (status, include_completed)
+            cached = self._todos_cache.get(cache_key)
+            if cached and time.monotonic() - cached[1] < TODO_LIST_CACHE_TTL:
+                # 呼び出し側が各TODOを書き換えてもキャッシュに波及しないよう要素ごとコピーして返す
+                return [dict(todo) for todo in cached[0]]
+            
             # チーム全体のTODOを取得（user_idフィルターを削除）
             query = self.db.collection('todos')
             
@@ -67,7 +97,7 @@ class TodoManager:
             # query = query.order_by('due_date')
             
             todos = []
-            for doc in query.stream():
+            for doc in await asyncio.to_thread(query.get):
                 todo_data = doc.to_dict()
                 todo_data['id'] = doc.id
                 todos.append(todo_data)
@@ -79,7 +109,8 @@ class TodoManager:
                 todo.get('created_at', datetime.min.replace(tzinfo=pytz.UTC))  # 同じ優先度なら作成日順
             ))
             
-            return todos
+            self._todos_cache[cache_key] = (todos, time.monotonic())
+            return [dict(todo) for todo in todos]
             
         except Exception as e:
             logger.error(f"Failed to get TODOs: {e}")
@@ -89,7 +120,7 @@ class TodoManager:
         """TODOを更新（チーム共有）"""
         try:
             doc_ref = self.db.collection('todos').document(todo_id)
-            doc = doc_ref.get()
+            doc = await asyncio.to_thread(doc_ref.get)
             
             if not doc.exists:
                 logger.warning(f"TODO {todo_id} not found")
@@ -99,15 +130,16 @@ class TodoManager:
             # 誰でも編集可能
             
             # 更新者情報を追加
-            updates['updated_at'] = datetime.now(pytz.timezone('Asia/Tokyo')).astimezone(pytz.UTC)
+            updates['updated_at'] = datetime.now(pytz.UTC)
             updates['updated_by'] = user_id
             
             # 完了処理
             if updates.get('status') == 'completed':
-                updates['completed_at'] = datetime.now(pytz.timezone('Asia/Tokyo')).astimezone(pytz.UTC)
+                updates['completed_at'] = updates['updated_at']
                 updates['completed_by'] = user_id
             
-            doc_ref.update(updates)
+            await asyncio.to_thread(doc_ref.update, updates)
+            self._invalidate_todos_cache()
             logger.info(f"Updated TODO {todo_id} by user {user_id}")
             return True
             
@@ -119,7 +151,7 @@ class TodoManager:
         """TODOを削除（チーム共有）"""
         try:
             doc_ref = self.db.collection('todos').document(todo_id)
-            doc = doc_ref.get()
+            doc = await asyncio.to_thread(doc_ref.get)
             
             if not doc.exists:
                 return False
@@ -127,7 +159,8 @@ class TodoManager:
             # チーム共有なので所有者チェックを削除
             # 誰でも削除可能
             
-            doc_ref.delete()
+            await asyncio.to_thread(doc_ref.delete)
+            self._invalidate_todos_cache()
             logger.info(f"Deleted TODO {todo_id} by user {user_id}")
             return True
             
@@ -145,21 +178,33 @@ class TodoManager:
                 return {'success': False, 'message': 'TODOリストが空です'}
             
             # 番号を1ベースから0ベースに変換
-            deleted_count = 0
             failed_numbers = []
-            deleted_titles = []
+            targets = []
+            seen_ids = set()
             
             for number in todo_numbers:
                 if 1 <= number <= len(todos):
                     todo_to_delete = todos[number - 1]
-                    if await self.delete_todo(todo_to_delete['id'], user_id):
-                        deleted_count += 1
-                        deleted_titles.append(todo_to_delete.get('title', ''))
-                    else:
-                        failed_numbers.append(number)
+                    if todo_to_delete['id'] not in seen_ids:
+                        seen_ids.add(todo_to_delete['id'])
+                        targets.append(todo_to_delete)
                 else:
                     failed_numbers.append(number)
             
+            # 1件ずつではなくWriteBatchでまとめて削除（上限500件ずつ）
+            deleted_titles = []
+            for i in range(0, len(targets), 500):
+                chunk = targets[i:i + 500]
+                batch = self.db.batch()
+                for todo_to_delete in chunk:
+                    batch.delete(self.db.collection('todos').document(todo_to_delete['id']))
+                await asyncio.to_thread(batch.commit)
+                self._invalidate_todos_cache()
+                deleted_titles.extend(todo.get('title', '') for todo in chunk)
+            
+            deleted_count = len(deleted_titles)
+            logger.info(f"Deleted {deleted_count} TODOs by user {user_id}")
+            
             result = {
                 'success': deleted_count > 0,
                 'deleted_count': deleted_count,
@@ -294,7 +339,7 @@ class TodoManager:
                     }
                 else:
                     # JSTで表示
-                    time_jst = remind_time.astimezone(pytz.timezone('Asia/Tokyo')) if remind_time else None
+                    time_jst = remind_time.astimezone(JST) if remind_time else None
                     time_str = time_jst.strftime('%Y-%m-%d %H:%M JST') if time_jst else '指定時間'
                     mention_str = f'@{mention_target}' if mention_target != 'everyone' else '@everyone'
                     channel_str = f'#{channel_target}チャンネル'
@@ -320,7 +365,7 @@ class TodoManager:
     async def get_pending_reminders(self) -> List[Dict[str, Any]]:
         """リマインダーが必要なTODOを取得"""
         try:
-            now = datetime.now(pytz.timezone('Asia/Tokyo')).astimezone(pytz.UTC)
+            now = datetime.now(pytz.UTC)
             
             # 期限が近づいているTODOを取得
             query = (self.db.collection('todos')
@@ -330,7 +375,7 @@ class TodoManager:
                     .where('due_date', '<=', now + timedelta(hours=24)))
             
             todos = []
-            for doc in query.stream():
+            for doc in await asyncio.to_thread(query.get):
                 todo_data = doc.to_dict()
                 todo_data['id'] = doc.id
                 todos.append(todo_data)
@@ -345,7 +390,8 @@ class TodoManager:
         """リマインダー送信済みにマーク"""
         try:
             doc_ref = self.db.collection('todos').document(todo_id)
-            doc_ref.update({'reminder_sent': True})
+            await asyncio.to_thread(doc_ref.update, {'reminder_sent': True})
+            self._invalidate_todos_cache()
             return True
         except Exception as e:
             logger.error(f"Failed to mark reminder sent: {e}")
@@ -379,36 +425,27 @@ class TodoManager:
         if not todos:
             return "📝 チームTODOリストは空です。"
         
-        # 優先度アイコン定義（激高、高、普通、低）
-        priority_icons = {
-            'urgent': '⚫',   # 激高
-            'high': '🔴',     # 高
-            'normal': '🟡',   # 普通
-            'low': '🟢'       # 低い
-        }
-        
-        formatted = ""
+        parts = []
         
         for i, todo in enumerate(todos, 1):
             # 優先度アイコンを先頭に、番号とタイトルを表示
             priority = todo.get('priority', 'normal')
-            priority_icon = priority_icons.get(priority, '🟡')
-            formatted += f"{priority_icon} {i}. {todo['title']}\n"
+            priority_icon = PRIORITY_ICONS.get(priority, '🟡')
+            parts.append(f"{priority_icon} {i}. {todo['title']}\n")
             
             if todo.get('description'):
-                formatted += f"   📝 {todo['description']}\n"
+                parts.append(f"   📝 {todo['description']}\n")
             
             if todo.get('due_date'):
                 due_date = todo['due_date']
                 if isinstance(due_date, datetime):
                     # JSTで期限を表示
-                    due_date_jst = due_date.astimezone(pytz.timezone('Asia/Tokyo'))
-                    formatted += f"   📅 期限: {due_date_jst.strftime('%Y-%m-%d %H:%M')}\n"
-            
+                    due_date_jst = due_date.astimezone(JST)
+                    parts.append(f"   📅 期限: {due_date_jst.strftime('%Y-%m-%d %H:%M')}\n")
             
-            formatted += "\n"
+            parts.append("\n")
         
-        return formatted
+        return "".join(parts)
 
 # グローバルインスタンス
 todo_manager = TodoManager()
\ No newline at end of file
@@ -3,9 +3,95 @@
 """
 import re
 from datetime import datetime, timedelta
+from operator import itemgetter
 from typing import Dict, Any, Optional, Tuple
 import pytz
 
+
+def _build_keyword_scanner(keyword_table: Dict[str, list]) -> Tuple[re.Pattern, Dict[str, Tuple[str, ...]]]:
+    """全キーワードを1本の先読み正規表現にまとめ、キーワード -> アクション一覧の表と一緒に返す
+
+    先読みなので重なり合うキーワードも1回の走査ですべて拾える
+    （同じ位置から始まるキーワード同士が前方一致で重ならない前提）
+    """
+    keyword_actions: Dict[str, Tuple[str, ...]] = {}
+    for action, keywords in keyword_table.items():
+        for keyword in keywords:
+            keyword_actions[keyword] = keyword_actions.get(keyword, ()) + (action,)
+    alternation = '|'.join(map(re.escape, sorted(keyword_actions, key=len, reverse=True)))
+    return re.compile(f'(?=({alternation}))'), keyword_actions
+
+
+class _KeywordTrie:
+    """文字単位のトライ（前方一致で重なるキーワードも含め、本文中に現れるラベルをまとめて拾う）"""
+    
+    __slots__ = ('_root',)
+    
+    def __init__(self, keyword_table: Dict[str, list]):
+        root: Dict[str, Any] = {}
+        for label, keywords in keyword_table.items():
+            for keyword in keywords:
+                node = root
+                for char in keyword:
+                    node = node.setdefault(char, {})
+                # 終端には1文字のキーと衝突しない空文字キーでラベルを置く
+                node[''] = node.get('', ()) + (label,)
+        self._root = root
+    
+    def labels_in(self, text: str) -> set:
+        """本文に含まれるキーワードのラベル集合"""
+        found = set()
+        root_get = self._root.get
+        length = len(text)
+        for start in range(length):
+            node = root_get(text[start])
+            pos = start + 1
+            while node is not None:
+                labels = node.get('')
+                if labels:
+                    found.update(labels)
+                if pos >= length:
+                    break
+                node = node.get(text[pos])
+                pos += 1
+        return found
+
+
+def _keyword_pattern(keywords: list) -> re.Pattern:
+    """キーワードのどれかを含むかを1回で判定する正規表現"""
+    return re.compile('|'.join(map(re.escape, keywords)))
+
+
+# 優先度判定用（「激高」が「高」より、「低」が「高」より優先されるよう順に評価する）
+_URGENT_PRIORITY_PATTERN = _keyword_pattern([
+    '激高', '最高優先度', '最優先', '超緊急', '超重要', 'クリティカル',
+    '最重要', '即座', '即時', '緊急', '至急', 'すぐ', '今すぐ', 'asap'
+])
+_LOW_PRIORITY_PATTERN = _keyword_pattern([
+    '低優先度', '低い', '低め', 'あとで', '後回し', 'いつでも',
+    '余裕', 'ゆっくり', '時間がある時', '暇な時', '後で'
+])
+_HIGH_PRIORITY_PATTERN = _keyword_pattern([
+    '高優先度', '高い', '高め', '高', '重要', '大事', '優先',
+    '急ぎ', '早め', '重視', '大切'
+])
+
+
+# メンション対象のキーワード（評価順: ユーザー → ロール）
+_MENTION_PATTERNS = {
+    'mrc': ['@mrc', 'mrc', 'mrcvgl', '@mrcvgl', 'mrcさん', 'エムアールシー'],
+    'supy': ['@supy', 'supy', 'supy000', '@supy000', 'supyさん', 'スピー'],
+    'ko': ['@ko', 'ko', 'kouhei', '@kouhei', 'koさん', 'コウヘイ'],
+    'catherine': ['@catherine', 'catherine', 'キャサリン', 'カトリン'],
+    'role:admin': ['@admin', 'admin', 'administrator', '管理者', 'アドミン'],
+    'role:moderator': ['@mod', 'mod', 'moderator', 'モデレーター'],
+    'role:member': ['@member', 'member', 'メンバー', '参加者'],
+    'role:staff': ['@staff', 'staff', 'スタッフ'],
+    'role:developer': ['@dev', 'dev', 'developer', '開発者'],
+}
+_MENTION_TRIE = _KeywordTrie(_MENTION_PATTERNS)
+
+
 class TodoNLU:
     """TODO操作の自然言語理解"""
     
@@ -20,6 +106,49 @@ class TodoNLU:
         'remind': ['リマインド', 'リマインダー', '通知', '教えて', '忘れないで']
     }
     
+    # TODO更新パターン（上から順に試す）
+    _UPDATE_PATTERNS = tuple(map(re.compile, (
+        # 「1は名前を○○にして」パターン
+        r'(\d+)(?:は|を)(?:名前を|)(.+?)(?:にして|に変更)',
+        # 「1を○○に変更」パターン
+        r'(\d+)を(.+?)(?:に変更|にして|に修正)',
+        # 「1の名前を○○」パターン
+        r'(\d+)の(?:名前を|タイトルを|)(.+)',
+        # 「○番を××に」パターン
+        r'(\d+)番を(.+)に',
+        # 「○番は××」パターン
+        r'(\d+)番は(.+)',
+        # 「○は××にして」パターン
+        r'(\d+)は(.+?)(?:にして|に)',
+        # 「○を××にして」パターン
+        r'(\d+)を(.+?)(?:にして|に)',
+        # 「○を××」パターン
+        r'(\d+)を(.+)',
+    )))
+    _UPDATE_SUFFIX_PATTERN = re.compile(r'(?:して|に変更|に修正|にして)$')
+    
+    # 優先度変更パターン（上から順に試す）
+    _PRIORITY_CHANGE_PATTERNS = tuple(map(re.compile, (
+        # 「○は優先度××に」パターン
+        r'(\d+)は(?:優先度|)(.+?)(?:に|にして)',
+        # 「○の優先度を××に」パターン
+        r'(\d+)の優先度を(.+?)(?:に|にして)',
+        # 「○番を××に」パターン（優先度関連の場合）
+        r'(\d+)番を(.+?)(?:に|にして)',
+        # 「○を××優先度に」パターン
+        r'(\d+)を(.+?)(?:優先度に|に)',
+    )))
+    
+    # リマインドのカスタムメッセージとみなす語
+    _CUSTOM_REMIND_KEYWORDS = (
+        '起こして', '起きて', '起こしてくれ', '起きてくれ', '教えて', '知らせて', '呼んで',
+        '何してる', '何してる？', '何してるか', '何してるの', '何しててる', '何しててる？',
+        '確認して', '聞いて', '連絡して', '伝えて', '声かけて', 'チェックして'
+    )
+    
+    # アクションキーワードの一括走査用
+    _ACTION_KEYWORD_SCAN, _KEYWORD_ACTIONS = _build_keyword_scanner(ACTION_KEYWORDS)
+    
     # 優先度キーワード（激高、高、普通、低）
     PRIORITY_KEYWORDS = {
         'urgent': ['激高', '最高優先度', '最優先', '超緊急', '超重要', '緊急', '至急', 
@@ -48,6 +177,17 @@ class TodoNLU:
         '日曜': lambda: TodoNLU._get_next_weekday(6),
     }
     
+    # アクション名 -> 解析メソッド名（全解析メソッドは (元の本文, 小文字化済みの本文) を受け取る）
+    _ACTION_PARSERS = {
+        'create': '_parse_create',
+        'list': '_parse_list',
+        'complete': '_parse_complete',
+        'delete': '_parse_delete',
+        'update': '_parse_update',
+        'priority': '_parse_priority',
+        'remind': '_parse_remind',
+    }
+    
     @staticmethod
     def _get_weekend():
         """次の週末を取得（東京時間ベース）"""
@@ -68,6 +208,10 @@ class TodoNLU:
         next_day = (now + timedelta(days=days_ahead)).replace(hour=23, minute=59)
         return next_day.astimezone(pytz.UTC)
     
+    def __init__(self):
+        # アクション名 -> バインド済み解析メソッド（メッセージごとのgetattrを避ける）
+        self._parsers = {action: getattr(self, name) for action, name in self._ACTION_PARSERS.items()}
+    
     def parse_message(self, message: str) -> Dict[str, Any]:
         """メッセージを解析してTODO操作を理解"""
         message_lower = message.lower()
@@ -76,22 +220,10 @@ class TodoNLU:
         action = self._detect_action(message_lower)
         
         # アクションごとの解析
-        if action == 'create':
-            return self._parse_create(message)
-        elif action == 'list':
-            return self._parse_list(message_lower)
-        elif action == 'complete':
-            return self._parse_complete(message)
-        elif action == 'delete':
-            return self._parse_delete(message)
-        elif action == 'update':
-            return self._parse_update(message)
-        elif action == 'priority':
-            return self._parse_priority(message)
-        elif action == 'remind':
-            return self._parse_remind(message)
-        else:
+        parser = self._parsers.get(action)
+        if parser is None:
             return {'action': None, 'confidence': 0}
+        return parser(message, message_lower)
     
     def _detect_action(self, message: str) -> Optional[str]:
         """メッセージからアクションを検出"""
@@ -115,18 +247,22 @@ class TodoNLU:
             if not any(word in message for word in ['追加', '作成', '作って', '登録', 'リマインド', '通知']):
                 return 'list'
         
-        max_score = 0
-        detected_action = None
+        # 1回の走査で含まれるキーワードを集め、アクションごとに数える
+        hits = set(self._ACTION_KEYWORD_SCAN.findall(message))
+        if not hits:
+            return None
         
-        for action, keywords in self.ACTION_KEYWORDS.items():
-            score = sum(1 for keyword in keywords if keyword in message)
-            if score > max_score:
-                max_score = score
-                detected_action = action
+        scores = dict.fromkeys(self.ACTION_KEYWORDS, 0)
+        keyword_actions = self._KEYWORD_ACTIONS
+        for keyword in hits:
+            for action in keyword_actions[keyword]:
+                scores[action] += 1
         
+        # 同点なら定義順で先のアクション（maxは最初の最大値を返す）
+        detected_action, max_score = max(scores.items(), key=itemgetter(1))
         return detected_action if max_score > 0 else None
     
-    def _parse_create(self, message: str) -> Dict[str, Any]:
+    def _parse_create(self, message: str, message_lower: str) -> Dict[str, Any]:
         """TODO作成コマンドを解析"""
         # タイトルを抽出（「」や『』で囲まれている部分を優先）
         title_match = re.search(r'[「『"](.*?)[」』"]', message)
@@ -136,9 +272,9 @@ class TodoNLU:
             # キーワード後の文字列をタイトルとする
             title = message  # デフォルト値
             for keyword in self.ACTION_KEYWORDS['create']:
-                if keyword in message.lower():
+                if keyword in message_lower:
                     # 元のメッセージを使って分割（大文字小文字保持）
-                    keyword_pos = message.lower().find(keyword)
+                    keyword_pos = message_lower.find(keyword)
                     if keyword_pos != -1:
                         if keyword_pos == 0:
                             # キーワードが先頭にある場合、後ろの部分を取得
@@ -147,20 +283,19 @@ class TodoNLU:
                             # キーワードが後ろにある場合、前の部分を取得
                             title = message[:keyword_pos].strip()
                         
-                        # 期限などの表現を除去
-                        for time_key in self.TIME_PATTERNS.keys():
-                            title = title.replace(time_key, '').strip()
+                        # 期限などの表現を除去（含まれていないキーは置換しない）
+                        for time_key in self.TIME_PATTERNS:
+                            if time_key in title:
+                                title = title.replace(time_key, '').strip()
                         break
             
             # タイトルが空の場合はメッセージ全体を使用
             if not title:
                 title = message
         
-        # 優先度を検出
-        priority = self._detect_priority(message.lower())
-        
-        # 期限を検出
-        due_date = self._detect_due_date(message.lower())
+        # 優先度・期限を検出
+        priority = self._detect_priority(message_lower)
+        due_date = self._detect_due_date(message_lower)
         
         return {
             'action': 'create',
@@ -170,10 +305,10 @@ class TodoNLU:
             'confidence': 0.8
         }
     
-    def _parse_list(self, message: str) -> Dict[str, Any]:
+    def _parse_list(self, message: str, message_lower: str) -> Dict[str, Any]:
         """TODOリスト表示コマンドを解析"""
         # フィルター条件を検出
-        include_completed = '完了' in message or '全て' in message or 'すべて' in message
+        include_completed = '完了' in message_lower or '全て' in message_lower or 'すべて' in message_lower
         
         return {
             'action': 'list',
@@ -181,7 +316,7 @@ class TodoNLU:
             'confidence': 0.9
         }
     
-    def _parse_complete(self, message: str) -> Dict[str, Any]:
+    def _parse_complete(self, message: str, message_lower: str) -> Dict[str, Any]:
         """TODO完了コマンドを解析"""
         # 番号を検出
         number_match = re.search(r'(\d+)', message)
@@ -190,9 +325,9 @@ class TodoNLU:
         # タイトルの一部を検出
         title_keywords = None
         for keyword in self.ACTION_KEYWORDS['complete']:
-            parts = message.split(keyword)
-            if len(parts) > 1:
-                title_keywords = parts[0].strip()
+            before, found, _ = message.partition(keyword)
+            if found:
+                title_keywords = before.strip()
                 break
         
         return {
@@ -202,7 +337,7 @@ class TodoNLU:
             'confidence': 0.7
         }
     
-    def _parse_delete(self, message: str) -> Dict[str, Any]:
+    def _parse_delete(self, message: str, message_lower: str) -> Dict[str, Any]:
         """TODO削除コマンドを解析"""
         # 複数番号を検出（例: 1,2,3 や 1.2.3 や 1 2 3）
         numbers = re.findall(r'(\d+)', message)
@@ -218,7 +353,7 @@ class TodoNLU:
             'confidence': 0.7
         }
     
-    def _parse_update(self, message: str) -> Dict[str, Any]:
+    def _parse_update(self, message: str, message_lower: str) -> Dict[str, Any]:
         """TODO更新コマンドを解析"""
         # 番号を検出
         number_match = re.search(r'(\d+)', message)
@@ -228,38 +363,19 @@ class TodoNLU:
         new_content = None
         
         # より多様なパターンに対応
-        patterns = [
-            # 「1は名前を○○にして」パターン
-            r'(\d+)(?:は|を)(?:名前を|)(.+?)(?:にして|に変更)',
-            # 「1を○○に変更」パターン
-            r'(\d+)を(.+?)(?:に変更|にして|に修正)',
-            # 「1の名前を○○」パターン
-            r'(\d+)の(?:名前を|タイトルを|)(.+)',
-            # 「○番を××に」パターン
-            r'(\d+)番を(.+)に',
-            # 「○番は××」パターン
-            r'(\d+)番は(.+)',
-            # 「○は××にして」パターン
-            r'(\d+)は(.+?)(?:にして|に)',
-            # 「○を××にして」パターン
-            r'(\d+)を(.+?)(?:にして|に)',
-            # 「○を××」パターン
-            r'(\d+)を(.+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, message)
+        for pattern in self._UPDATE_PATTERNS:
+            match = pattern.search(message)
             if match:
                 todo_number = int(match.group(1))
                 new_content = match.group(2).strip()
                 # 不要な語尾を除去
-                new_content = re.sub(r'(?:して|に変更|に修正|にして)$', '', new_content).strip()
+                new_content = self._UPDATE_SUFFIX_PATTERN.sub('', new_content).strip()
                 break
         
         # パターンマッチしなかった場合の従来の方法
         if not new_content:
             for keyword in self.ACTION_KEYWORDS['update']:
-                if keyword in message.lower():
+                if keyword in message_lower:
                     parts = message.split(keyword)
                     if len(parts) > 1:
                         new_content = parts[1].strip()
@@ -272,37 +388,25 @@ class TodoNLU:
             'confidence': 0.8 if new_content else 0.3
         }
     
-    def _detect_priority(self, message: str) -> str:
-        """メッセージから優先度を検出（長いキーワードを優先）"""
-        # 「激高」が「高」より優先されるよう、長いキーワードから順にチェック
-        message_lower = message.lower()
+    def _detect_priority(self, message_lower: str) -> str:
+        """小文字化済みのメッセージから優先度を検出（長いキーワードを優先）"""
+        # 「激高」が「高」より優先されるよう、urgent → low → high の順にチェック
         
-        # urgent（激高）を最初にチェック - 最も具体的なキーワードから
-        urgent_keywords = ['激高', '最高優先度', '最優先', '超緊急', '超重要', 'クリティカル', 
-                          '最重要', '即座', '即時', '緊急', '至急', 'すぐ', '今すぐ', 'asap']
-        if any(keyword in message_lower for keyword in urgent_keywords):
+        # urgent（激高）を最初にチェック
+        if _URGENT_PRIORITY_PATTERN.search(message_lower):
             return 'urgent'
         
         # low（低）をチェック - 「高」の誤認識を防ぐため先にチェック
-        low_keywords = ['低優先度', '低い', '低め', 'あとで', '後回し', 'いつでも', 
-                       '余裕', 'ゆっくり', '時間がある時', '暇な時', '後で']
-        if any(keyword in message_lower for keyword in low_keywords):
+        if _LOW_PRIORITY_PATTERN.search(message_lower):
             return 'low'
         
         # high（高）をチェック（「激高」「低」が含まれていないことを確認）
         if '激高' not in message_lower and '低' not in message_lower:
-            high_keywords = ['高優先度', '高い', '高め', '高', '重要', '大事', '優先', 
-                           '急ぎ', '早め', '重視', '大切']
-            if any(keyword in message_lower for keyword in high_keywords):
+            if _HIGH_PRIORITY_PATTERN.search(message_lower):
                 return 'high'
         
-        # normal（普通）をチェック
-        normal_keywords = ['普通', '通常', 'ノーマル', '中程度', '標準', 
-                         'デフォルト', 'ふつう', '並', '中']
-        if any(keyword in message_lower for keyword in normal_keywords):
-            return 'normal'
-        
-        return 'normal'  # デフォルト
+        # 普通のキーワードの有無にかかわらず normal
+        return 'normal'
     
     def _detect_due_date(self, message: str) -> Optional[datetime]:
         """メッセージから期限を検出"""
@@ -402,38 +506,27 @@ class TodoNLU:
         
         return None
     
-    def _parse_priority(self, message: str) -> Dict[str, Any]:
+    def _parse_priority(self, message: str, message_lower: str) -> Dict[str, Any]:
         """優先度変更コマンドを解析"""
         # 番号を検出
         number_match = re.search(r'(\d+)', message)
         todo_number = int(number_match.group(1)) if number_match else None
         
         # より多様なパターンに対応
-        priority_patterns = [
-            # 「○は優先度××に」パターン
-            r'(\d+)は(?:優先度|)(.+?)(?:に|にして)',
-            # 「○の優先度を××に」パターン
-            r'(\d+)の優先度を(.+?)(?:に|にして)',
-            # 「○番を××に」パターン（優先度関連の場合）
-            r'(\d+)番を(.+?)(?:に|にして)',
-            # 「○を××優先度に」パターン
-            r'(\d+)を(.+?)(?:優先度に|に)',
-        ]
-        
         extracted_priority = None
-        for pattern in priority_patterns:
-            match = re.search(pattern, message)
+        for pattern in self._PRIORITY_CHANGE_PATTERNS:
+            match = pattern.search(message)
             if match:
                 todo_number = int(match.group(1))
                 priority_text = match.group(2).strip()
                 # 優先度キーワードから実際の優先度を検出
-                extracted_priority = self._detect_priority(priority_text)
+                extracted_priority = self._detect_priority(priority_text.lower())
                 if extracted_priority:
                     break
         
         # パターンマッチしなかった場合の従来の方法
         if not extracted_priority:
-            extracted_priority = self._detect_priority(message.lower())
+            extracted_priority = self._detect_priority(message_lower)
         
         return {
             'action': 'priority',
@@ -442,7 +535,7 @@ class TodoNLU:
             'confidence': 0.8 if extracted_priority and todo_number else 0.3
         }
     
-    def _parse_remind(self, message: str) -> Dict[str, Any]:
+    def _parse_remind(self, message: str, message_lower: str) -> Dict[str, Any]:
         """リマインド設定コマンドを解析"""
         # カスタムメッセージを検出（「。」の後、または特定のパターン）
         custom_message = None
@@ -459,14 +552,8 @@ class TodoNLU:
             remind_match = re.search(r'リマインド[　\s]*(.+)', message)
             if remind_match:
                 potential_custom = remind_match.group(1).strip()
-                # カスタムメッセージのキーワードを拡張
-                custom_keywords = [
-                    '起こして', '起きて', '起こしてくれ', '起きてくれ', '教えて', '知らせて', '呼んで',
-                    '何してる', '何してる？', '何してるか', '何してるの', '何しててる', '何しててる？',
-                    '確認して', '聞いて', '連絡して', '伝えて', '声かけて', 'チェックして'
-                ]
                 # より柔軟な検出：メンション先が含まれていて、かつカスタムキーワードがあるか、または明らかにメッセージっぽい
-                has_custom_keyword = any(keyword in potential_custom for keyword in custom_keywords)
+                has_custom_keyword = any(keyword in potential_custom for keyword in self._CUSTOM_REMIND_KEYWORDS)
                 has_mention = any(word in potential_custom for word in ['supy', 'mrc', '@'])
                 is_question = '？' in potential_custom or '?' in potential_custom
                 
@@ -513,7 +600,7 @@ class TodoNLU:
                     break
         
         # 時間指定を検出
-        remind_time = self._detect_due_date(message.lower())
+        remind_time = self._detect_due_date(message_lower)
         
         # カスタムメッセージがあって時間指定がない場合は即座実行
         if custom_message and not remind_time:
@@ -532,11 +619,11 @@ class TodoNLU:
             todo_number = None  # 全リスト通知の場合は番号なし
         
         # メンション先を検出（より高度な解析）
-        mention_target = self._parse_mention_target(message)
+        mention_target = self._parse_mention_target(message, message_lower)
         
         # チャンネル指定を検出
         channel_target = 'todo'  # デフォルト
-        if 'todo' in message.lower() or '#todo' in message.lower():
+        if 'todo' in message_lower:
             channel_target = 'todo'
         elif '#' in message:
             channel_match = re.search(r'#(\w+)', message)
@@ -555,38 +642,18 @@ class TodoNLU:
             'confidence': 0.7
         }
     
-    def _parse_mention_target(self, message: str) -> str:
+    def _parse_mention_target(self, message: str, message_lower: str) -> str:
         """メンション対象を詳細に解析"""
-        message_lower = message.lower()
-        
         # 明示的な@everyone
         if '@everyone' in message_lower or 'みんな' in message_lower or '全員' in message_lower:
             return 'everyone'
         
-        # 特定ユーザー（拡張可能）
-        user_patterns = {
-            'mrc': ['@mrc', 'mrc', 'mrcvgl', '@mrcvgl', 'mrcさん', 'エムアールシー'],
-            'supy': ['@supy', 'supy', 'supy000', '@supy000', 'supyさん', 'スピー'],
-            'ko': ['@ko', 'ko', 'kouhei', '@kouhei', 'koさん', 'コウヘイ'],
-            'catherine': ['@catherine', 'catherine', 'キャサリン', 'カトリン']
-        }
-        
-        for user, patterns in user_patterns.items():
-            if any(pattern in message_lower for pattern in patterns):
-                return user
-        
-        # ロールの検出
-        role_patterns = {
-            'admin': ['@admin', 'admin', 'administrator', '管理者', 'アドミン'],
-            'moderator': ['@mod', 'mod', 'moderator', 'モデレーター'],
-            'member': ['@member', 'member', 'メンバー', '参加者'],
-            'staff': ['@staff', 'staff', 'スタッフ'],
-            'developer': ['@dev', 'dev', 'developer', '開発者']
-        }
-        
-        for role, patterns in role_patterns.items():
-            if any(pattern in message_lower for pattern in patterns):
-                return f'role:{role}'
+        # 特定ユーザー・ロール（トライで1回走査し、評価順で最初に当たったものを返す）
+        found = _MENTION_TRIE.labels_in(message_lower)
+        if found:
+            for label in _MENTION_PATTERNS:
+                if label in found:
+                    return label
         
         # 一般的な@メンション
         mention_match = re.search(r'@(\w+)', message_lower)
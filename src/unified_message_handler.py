@@ -2,22 +2,126 @@
 統合メッセージハンドラー - 高度NLUとGoogle統合を組み合わせたシステム
 """
 import logging
-from typing import Dict, Any, Optional
+import random
+import re
+import time
+from functools import lru_cache
+from typing import Dict, Any, Optional, Callable, Awaitable
 import discord
-from datetime import datetime, timedelta
+from datetime import datetime
 import pytz
 
 logger = logging.getLogger(__name__)
 
+# 東京タイムゾーン（呼び出しごとに引かない）
+JST = pytz.timezone('Asia/Tokyo')
+
+# フォールバック意図理解のキーワード表（評価順）
+_SIMPLE_INTENT_KEYWORDS = (
+    ('list', ('リスト', 'list', '一覧', '全部', '全リスト')),
+    ('create', ('追加', 'add', '作成', 'create', 'を', 'やる', 'する')),
+    ('complete', ('完了', 'done', '終了', 'complete', '済み')),
+    ('delete', ('削除', 'delete', '消す', '消去')),
+    ('custom_reminder', ('リマインド', 'remind', '時間後', '分後', '明日', '今日')),
+)
+
+_NUMBER_PATTERN = re.compile(r'\d+')
+
+@lru_cache(maxsize=256)
+def _classify_simple_intent(content_lower: str) -> Optional[str]:
+    """小文字化済みメッセージから最初に一致したアクション名を返す"""
+    for action, keywords in _SIMPLE_INTENT_KEYWORDS:
+        if any(word in content_lower for word in keywords):
+            return action
+    return None
+
+# 現在分のISO文字列キャッシュ [エポック分, 文字列]
+_minute_iso_cache = [None, ""]
+
+def _current_minute_iso() -> str:
+    """JSTの現在時刻（分単位）のISO文字列（同じ分の間は使い回す）"""
+    minute = int(time.time() // 60)
+    if _minute_iso_cache[0] != minute:
+        now = datetime.now(JST).replace(second=0, microsecond=0)
+        _minute_iso_cache[0] = minute
+        _minute_iso_cache[1] = now.isoformat()
+    return _minute_iso_cache[1]
+
+# フォールバック返答用の魔女風パターン
+_WITCH_RESPONSES = {
+    'create_success': (
+        "ふふ、新しいTODOを追加したよ",
+        "あらあら、また一つ増えちゃったね", 
+        "やれやれ、追加完了だよ",
+        "まったく、忙しくなるねぇ"
+    ),
+    'list_success': (
+        "ふふ、TODOリストを見せてあげるよ",
+        "あらあら、やることがいろいろあるねぇ",
+        "やれやれ、リストはこんな感じだよ"
+    ),
+    'complete_success': (
+        "ふふ、お疲れさま。一つ片付いたね",
+        "あらあら、よくできました",
+        "やれやれ、完了したよ"
+    ),
+    'delete_success': (
+        "ふふ、削除したよ",
+        "あらあら、消しちゃったね",
+        "やれやれ、なくなったよ"
+    ),
+    'error': (
+        "あらあら、うまくいかなかったねぇ",
+        "やれやれ、困ったことになったよ", 
+        "ごめんなさい、何かおかしいようだね"
+    ),
+    'chat': (
+        "ふふ、そうですねぇ",
+        "あらあら、なるほどねぇ",
+        "やれやれ、そういうことかい"
+    )
+}
+
+# 成功時の返答はアクション名から直接引く（呼び出しごとにキー文字列を組み立てない）
+_SUCCESS_RESPONSES = {
+    key[:-len('_success')]: pool
+    for key, pool in _WITCH_RESPONSES.items()
+    if key.endswith('_success')
+}
+
 class UnifiedMessageHandler:
     """統合メッセージ処理システム"""
     
+    # アクション名 -> ハンドラーメソッド名（全ハンドラーは (parameters, user_id) を受け取る）
+    _ACTION_HANDLERS = {
+        # TODO関連アクション
+        'create': '_handle_todo_create',
+        'list': '_handle_todo_list',
+        'complete': '_handle_todo_complete',
+        'delete': '_handle_todo_delete',
+        'update': '_handle_todo_update',
+        'priority': '_handle_todo_priority',
+        'remind': '_handle_todo_remind',
+        # Google Workspace関連アクション
+        'gmail_check': '_handle_gmail_check',
+        'gmail_search': '_handle_gmail_search',
+        'tasks_create': '_handle_google_tasks_create',
+        'tasks_list': '_handle_google_tasks_list',
+        'docs_create': '_handle_google_docs_create',
+        'sheets_create': '_handle_google_sheets_create',
+        'calendar_create_event': '_handle_calendar_create_event',
+        # カスタムリマインダー（自然言語）
+        'custom_reminder': '_handle_custom_reminder',
+    }
+    
     def __init__(self):
         self.advanced_nlu = None
         self.google_services = None
         self.todo_manager = None
         self.notion_integration = None
         self.initialized = False
+        # アクション名 -> バインド済みハンドラー（メッセージごとのgetattrを避ける）
+        self._handlers = {action: getattr(self, name) for action, name in self._ACTION_HANDLERS.items()}
 
     async def initialize(self):
         """システムの初期化"""
@@ -63,8 +167,9 @@ class UnifiedMessageHandler:
             logger.error(f"Failed to initialize unified message handler: {e}")
             self.initialized = False
 
-    async def handle_message(self, message: discord.Message) -> str:
-        """メッセージを処理して返答を生成"""
+    async def handle_message(self, message: discord.Message,
+                             on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """メッセージを処理して返答を生成（on_partial指定時は生成途中の返答も通知）"""
         if not self.initialized:
             await self.initialize()
             
@@ -77,7 +182,7 @@ class UnifiedMessageHandler:
                 "user_id": str(user.id),
                 "username": user.name,
                 "channel": message.channel.name if hasattr(message.channel, 'name') else 'DM',
-                "timestamp": datetime.now(pytz.timezone('Asia/Tokyo')).isoformat()
+                "timestamp": _current_minute_iso()
             }
             
             # 意図理解
@@ -86,7 +191,7 @@ class UnifiedMessageHandler:
                 logger.info(f"Intent analysis: action={intent_result.get('action')}, confidence={intent_result.get('confidence')}")
             else:
                 # Fallback: Simple keyword-based intent recognition
-                intent_result = await self._simple_intent_understanding(content)
+                intent_result = self._simple_intent_understanding(content)
                 logger.info(f"Simple intent analysis: action={intent_result.get('action')}")
             
             action = intent_result.get('action')
@@ -97,11 +202,15 @@ class UnifiedMessageHandler:
             execution_result = await self._execute_action_with_recovery(action, parameters, str(user.id))
             
             # 返答生成
-            if self.advanced_nlu:
+            # 一般会話は意図理解の呼び出しで返答まで生成済みなら、そのまま使う（API呼び出しを1回省く）
+            direct_reply = intent_result.get('reply') if action == 'chat' else None
+            if direct_reply:
+                response = direct_reply
+            elif self.advanced_nlu:
                 if execution_result:
-                    response = await self.advanced_nlu.generate_response(intent_result, execution_result)
+                    response = await self.advanced_nlu.generate_response(intent_result, execution_result, on_partial=on_partial)
                 else:
-                    response = await self.advanced_nlu.generate_response(intent_result)
+                    response = await self.advanced_nlu.generate_response(intent_result, on_partial=on_partial)
             else:
                 # Fallback response generation
                 response = await self._simple_response_generation(intent_result, execution_result)
@@ -169,50 +278,17 @@ class UnifiedMessageHandler:
     async def _execute_action(self, action: str, parameters: Dict[str, Any], user_id: str) -> Optional[Dict[str, Any]]:
         """アクションを実行"""
         try:
-            # TODO関連アクション
-            if action == 'create':
-                return await self._handle_todo_create(parameters, user_id)
-            elif action == 'list':
-                return await self._handle_todo_list(parameters, user_id)
-            elif action == 'complete':
-                return await self._handle_todo_complete(parameters, user_id)
-            elif action == 'delete':
-                return await self._handle_todo_delete(parameters, user_id)
-            elif action == 'update':
-                return await self._handle_todo_update(parameters, user_id)
-            elif action == 'priority':
-                return await self._handle_todo_priority(parameters, user_id)
-            elif action == 'remind':
-                return await self._handle_todo_remind(parameters, user_id)
-                
-            # Google Workspace関連アクション
-            elif action == 'gmail_check':
-                return await self._handle_gmail_check(parameters)
-            elif action == 'gmail_search':
-                return await self._handle_gmail_search(parameters)
-            elif action == 'tasks_create':
-                return await self._handle_google_tasks_create(parameters)
-            elif action == 'tasks_list':
-                return await self._handle_google_tasks_list(parameters)
-            elif action == 'docs_create':
-                return await self._handle_google_docs_create(parameters)
-            elif action == 'sheets_create':
-                return await self._handle_google_sheets_create(parameters)
-            elif action == 'calendar_create_event':
-                return await self._handle_calendar_create_event(parameters)
-                
-            # カスタムリマインダー（自然言語）
-            elif action == 'custom_reminder':
-                return await self._handle_custom_reminder(parameters, user_id)
-            
             # 通常の会話
-            elif action == 'chat':
+            if action == 'chat':
                 return {'success': True, 'type': 'chat', 'message': parameters.get('message', '')}
             
-            else:
+            handler = self._handlers.get(action)
+            if handler is None:
                 logger.warning(f"Unknown action: {action}")
                 return {'success': False, 'error': f'Unknown action: {action}'}
-                
+            
+            return await handler(parameters, user_id)
+
         except Exception as e:
             logger.error(f"Error executing action {action}: {e}")
             return {'success': False, 'error': str(e)}
@@ -377,41 +453,41 @@ class UnifiedMessageHandler:
             return {'success': False, 'error': f'外部リマインダー作成に失敗しました: {str(e)}'}
 
     # Google Workspace関連メソッド
-    async def _handle_gmail_check(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_gmail_check(self, parameters: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         """Gmail確認"""
         count_limit = parameters.get('count_limit', 5)
         return await self.google_services.check_gmail(count_limit)
 
-    async def _handle_gmail_search(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_gmail_search(self, parameters: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         """Gmail検索"""
         query = parameters.get('query', '')
         max_results = parameters.get('max_results', 10)
         return await self.google_services.search_gmail(query, max_results)
 
-    async def _handle_google_tasks_create(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_google_tasks_create(self, parameters: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         """Googleタスク作成"""
         title = parameters.get('title', 'New Task')
         notes = parameters.get('notes', '')
         due_date = parameters.get('due_date')
         return await self.google_services.create_google_task(title, notes, due_date)
 
-    async def _handle_google_tasks_list(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_google_tasks_list(self, parameters: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         """Googleタスク一覧"""
         return await self.google_services.list_google_tasks()
 
-    async def _handle_google_docs_create(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_google_docs_create(self, parameters: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         """Googleドキュメント作成"""
         title = parameters.get('title', 'New Document')
         content = parameters.get('content', '')
         return await self.google_services.create_google_doc(title, content)
 
-    async def _handle_google_sheets_create(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_google_sheets_create(self, parameters: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         """Googleスプレッドシート作成"""
         title = parameters.get('title', 'New Spreadsheet')
         data = parameters.get('data', None)
         return await self.google_services.create_google_sheet(title, data)
 
-    async def _handle_calendar_create_event(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_calendar_create_event(self, parameters: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         """カレンダーイベント作成"""
         title = parameters.get('title', 'New Event')
         start_time = parameters.get('start_time')
@@ -423,12 +499,12 @@ class UnifiedMessageHandler:
         else:
             return {'success': False, 'error': '開始時間が必要です'}
 
-    async def _simple_intent_understanding(self, content: str) -> Dict[str, Any]:
+    def _simple_intent_understanding(self, content: str) -> Dict[str, Any]:
         """簡単なキーワードベースの意図理解（フォールバック）"""
-        content_lower = content.lower()
+        action = _classify_simple_intent(content.lower())
         
         # TODOリスト関連
-        if any(word in content_lower for word in ['リスト', 'list', '一覧', '全部', '全リスト']):
+        if action == 'list':
             return {
                 "action": "list",
                 "confidence": 0.7,
@@ -437,7 +513,7 @@ class UnifiedMessageHandler:
             }
         
         # TODO作成関連
-        elif any(word in content_lower for word in ['追加', 'add', '作成', 'create', 'を', 'やる', 'する']):
+        elif action == 'create':
             return {
                 "action": "create",
                 "confidence": 0.6,
@@ -445,33 +521,19 @@ class UnifiedMessageHandler:
                 "reasoning": "キーワードベース: TODO作成"
             }
         
-        # TODO完了関連  
-        elif any(word in content_lower for word in ['完了', 'done', '終了', 'complete', '済み']):
-            # 番号を抽出
-            import re
-            numbers = re.findall(r'\d+', content)
+        # TODO完了・削除関連（番号がなければ会話として扱う）
+        elif action in ('complete', 'delete'):
+            numbers = _NUMBER_PATTERN.findall(content)
             if numbers:
                 return {
-                    "action": "complete",
+                    "action": action,
                     "confidence": 0.7,
                     "parameters": {"todo_number": int(numbers[0])},
-                    "reasoning": "キーワードベース: TODO完了"
-                }
-        
-        # TODO削除関連
-        elif any(word in content_lower for word in ['削除', 'delete', '消す', '消去']):
-            import re
-            numbers = re.findall(r'\d+', content)
-            if numbers:
-                return {
-                    "action": "delete", 
-                    "confidence": 0.7,
-                    "parameters": {"todo_number": int(numbers[0])},
-                    "reasoning": "キーワードベース: TODO削除"
+                    "reasoning": "キーワードベース: TODO完了" if action == 'complete' else "キーワードベース: TODO削除"
                 }
         
         # リマインダー関連
-        elif any(word in content_lower for word in ['リマインド', 'remind', '時間後', '分後', '明日', '今日']):
+        elif action == 'custom_reminder':
             return {
                 "action": "custom_reminder",
                 "confidence": 0.6,
@@ -491,46 +553,8 @@ class UnifiedMessageHandler:
         """簡単な返答生成（フォールバック）"""
         action = intent_result.get('action')
         
-        # 魔女風の返答パターン
-        witch_responses = {
-            'create_success': [
-                "ふふ、新しいTODOを追加したよ",
-                "あらあら、また一つ増えちゃったね", 
-                "やれやれ、追加完了だよ",
-                "まったく、忙しくなるねぇ"
-            ],
-            'list_success': [
-                "ふふ、TODOリストを見せてあげるよ",
-                "あらあら、やることがいろいろあるねぇ",
-                "やれやれ、リストはこんな感じだよ"
-            ],
-            'complete_success': [
-                "ふふ、お疲れさま。一つ片付いたね",
-                "あらあら、よくできました",
-                "やれやれ、完了したよ"
-            ],
-            'delete_success': [
-                "ふふ、削除したよ",
-                "あらあら、消しちゃったね",
-                "やれやれ、なくなったよ"
-            ],
-            'error': [
-                "あらあら、うまくいかなかったねぇ",
-                "やれやれ、困ったことになったよ", 
-                "ごめんなさい、何かおかしいようだね"
-            ],
-            'chat': [
-                "ふふ、そうですねぇ",
-                "あらあら、なるほどねぇ",
-                "やれやれ、そういうことかい"
-            ]
-        }
-        
-        import random
-        
         if execution_result and execution_result.get('success'):
-            response_key = f"{action}_success"
-            base_response = random.choice(witch_responses.get(response_key, witch_responses['chat']))
+            base_response = random.choice(_SUCCESS_RESPONSES.get(action, _WITCH_RESPONSES['chat']))
             
             # 結果に応じて詳細を追加
             if action == 'list' and execution_result.get('formatted_list'):
@@ -541,12 +565,12 @@ class UnifiedMessageHandler:
                 return base_response
         
         elif execution_result and not execution_result.get('success'):
-            base_response = random.choice(witch_responses['error'])
+            base_response = random.choice(_WITCH_RESPONSES['error'])
             error_msg = execution_result.get('error', '不明なエラー')
             return f"{base_response}\n{error_msg}"
         
         else:
-            return random.choice(witch_responses['chat'])
+            return random.choice(_WITCH_RESPONSES['chat'])
 
 # グローバルインスタンス
 unified_handler = UnifiedMessageHandler()
\ No newline at end of file
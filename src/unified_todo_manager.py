@@ -2,13 +2,43 @@
 統合TODOマネージャー - 明確な責任分担でサービス統合
 """
 import logging
-import asyncio
-from typing import Dict, List, Optional, Any, Union
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any
+from datetime import datetime
 import pytz
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+# 東京タイムゾーン（呼び出しごとに引かない）
+JST = pytz.timezone('Asia/Tokyo')
+
+# 一覧から除外する終了済みステータス
+_CLOSED_STATUSES = frozenset(['completed', 'cancelled'])
+
+# プロジェクト・長期タスク → Notion
+_PROJECT_KEYWORDS = (
+    'プロジェクト', 'project', '企画', '計画', '設計', 'design',
+    '資料', '報告書', 'レポート', 'report', '分析', 'analysis',
+    'プレゼン', 'presentation', '会議資料', '提案書'
+)
+
+# 日常・短期タスク → Google Tasks
+_DAILY_KEYWORDS = (
+    '買い物', 'shopping', '買う', '購入', '連絡', 'call', '電話',
+    'メール', 'email', '予約', '確認', 'check', '支払い', 'payment',
+    '掃除', 'clean', '洗濯', '料理', 'cook'
+)
+
+@lru_cache(maxsize=1024)
+def _classify_by_keywords(text_lower: str) -> str:
+    """小文字化済みのタイトル+説明からキーワードで保存先を判定（同じ文面は再判定しない）"""
+    if any(keyword in text_lower for keyword in _PROJECT_KEYWORDS):
+        return 'notion'
+    elif any(keyword in text_lower for keyword in _DAILY_KEYWORDS):
+        return 'google'
+    else:
+        return 'both'  # 判別不能なら両方に保存
+
 class UnifiedTodoManager:
     """
     統合TODOマネージャー - スマートルーティング
@@ -81,40 +111,16 @@ class UnifiedTodoManager:
         Returns:
             'notion' | 'google' | 'both'
         """
-        title_lower = title.lower()
-        desc_lower = description.lower()
-        
-        # プロジェクト・長期タスク → Notion
-        project_keywords = [
-            'プロジェクト', 'project', '企画', '計画', '設計', 'design',
-            '資料', '報告書', 'レポート', 'report', '分析', 'analysis',
-            'プレゼン', 'presentation', '会議資料', '提案書'
-        ]
-        
-        # 日常・短期タスク → Google Tasks
-        daily_keywords = [
-            '買い物', 'shopping', '買う', '購入', '連絡', 'call', '電話',
-            'メール', 'email', '予約', '確認', 'check', '支払い', 'payment',
-            '掃除', 'clean', '洗濯', '料理', 'cook'
-        ]
-        
         # 緊急度チェック
         if due_date:
-            days_until = (due_date - datetime.now(pytz.timezone('Asia/Tokyo'))).days
+            days_until = (due_date - datetime.now(JST)).days
             if days_until <= 1:  # 明日まで
                 return 'google'  # 緊急は日常タスクで管理
             elif days_until > 30:  # 1ヶ月以上先
                 return 'notion'  # 長期はプロジェクト管理
         
         # キーワードベース判定
-        all_text = f"{title_lower} {desc_lower}"
-        
-        if any(keyword in all_text for keyword in project_keywords):
-            return 'notion'
-        elif any(keyword in all_text for keyword in daily_keywords):
-            return 'google'
-        else:
-            return 'both'  # 判別不能なら両方に保存
+        return _classify_by_keywords(f"{title} {description}".lower())
     
     async def create_todo(self, title: str, user_id: str, priority: str = 'normal',
                          due_date: Optional[datetime] = None, description: str = '') -> Dict[str, Any]:
@@ -210,6 +216,13 @@ class UnifiedTodoManager:
         all_todos = []
         services_used = []
         
+        def collect(todo: Dict, source: str, service_icon: str, category: str):
+            """サービス情報を付けて追加（完了済み除外も同じパスで行う）"""
+            if not include_completed and todo.get('status') in _CLOSED_STATUSES:
+                return
+            # 取得元の辞書は書き換えず、サービス情報を付けた新しい辞書を積む
+            all_todos.append({**todo, 'source': source, 'service_icon': service_icon, 'category': category})
+        
         # Notionから取得
         if self.notion_integration:
             try:
@@ -218,10 +231,7 @@ class UnifiedTodoManager:
                 
                 if notion_result.get('success') and notion_result.get('todos'):
                     for todo in notion_result['todos']:
-                        todo['source'] = 'notion'
-                        todo['service_icon'] = '📝'
-                        todo['category'] = 'プロジェクト'
-                    all_todos.extend(notion_result['todos'])
+                        collect(todo, 'notion', '📝', 'プロジェクト')
                     services_used.append('📝 Notion')
                     
             except Exception as e:
@@ -241,12 +251,9 @@ class UnifiedTodoManager:
                             'status': 'completed' if task.get('status') == 'completed' else 'pending',
                             'priority': 'normal',
                             'due_date': task.get('due'),
-                            'created_by': user_id or 'google_tasks',
-                            'source': 'google_tasks',
-                            'service_icon': '📱',
-                            'category': '日常タスク'
+                            'created_by': user_id or 'google_tasks'
                         }
-                        all_todos.append(todo)
+                        collect(todo, 'google_tasks', '📱', '日常タスク')
                     services_used.append('📱 Google Tasks')
                     
             except Exception as e:
@@ -262,10 +269,7 @@ class UnifiedTodoManager:
                 
                 if firebase_todos:
                     for todo in firebase_todos:
-                        todo['source'] = 'firebase'
-                        todo['service_icon'] = '🔥'
-                        todo['category'] = 'ローカル'
-                    all_todos.extend(firebase_todos)
+                        collect(todo, 'firebase', '🔥', 'ローカル')
                     services_used.append('🔥 Firebase')
                     
             except Exception as e:
@@ -278,11 +282,6 @@ class UnifiedTodoManager:
             x.get('due_date') or '9999-12-31'  # 期限なしは最後
         ))
         
-        # 完了済み除外
-        if not include_completed:
-            all_todos = [todo for todo in all_todos 
-                        if todo.get('status') not in ['completed', 'cancelled']]
-        
         services_str = ' & '.join(services_used) if services_used else 'サービスなし'
         
         return {
@@ -339,31 +338,25 @@ class UnifiedTodoManager:
         if not todos:
             return "📝 TODOはありません"
         
-        # カテゴリ別にグループ化
-        categories = {}
-        for todo in todos:
-            category = todo.get('category', 'その他')
-            if category not in categories:
-                categories[category] = []
-            categories[category].append(todo)
+        # カテゴリ別にグループ化（全体番号も同時に確定させる）
+        categories: Dict[str, list] = {}
+        for global_index, todo in enumerate(todos, 1):
+            categories.setdefault(todo.get('category', 'その他'), []).append((global_index, todo))
         
+        priority_icons = {'urgent': '⚫', 'high': '🔴', 'normal': '🟡', 'low': '🟢'}
         formatted = f"📋 **統合TODOリスト** ({len(todos)}件)\n\n"
         
         # カテゴリ別表示
         for category, category_todos in categories.items():
             formatted += f"## {category} ({len(category_todos)}件)\n"
             
-            for i, todo in enumerate(category_todos, 1):
+            for global_index, todo in category_todos:
                 priority = todo.get('priority', 'normal')
                 service_icon = todo.get('service_icon', '❓')
                 
                 # 優先度アイコン
-                priority_icons = {'urgent': '⚫', 'high': '🔴', 'normal': '🟡', 'low': '🟢'}
                 priority_emoji = priority_icons.get(priority, '🟡')
                 
-                # 全体のインデックス計算
-                global_index = todos.index(todo) + 1
-                
                 formatted += f"{global_index}. {priority_emoji} **{todo['title']}** {service_icon}\n"
                 
                 if todo.get('due_date'):
@@ -2,6 +2,7 @@ from src.constants import (
     ALLOWED_SERVER_IDS,
 )
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 from src.base import Message
@@ -68,3 +69,34 @@ def should_block(guild: Optional[discord.Guild]) -> bool:
         logger.info(f"Guild {guild} not allowed")
         return True
     return False
+
+
+class StreamingReply:
+    """Shows a reply while it is being generated by editing a single message."""
+
+    EDIT_INTERVAL = 0.5  # seconds between edits, to stay under rate limits
+
+    def __init__(self, message: DiscordMessage):
+        self.message = message
+        self.sent: Optional[DiscordMessage] = None
+        self.last_edit = 0.0
+
+    async def update(self, text: str):
+        now = time.monotonic()
+        if not text or now - self.last_edit < self.EDIT_INTERVAL:
+            return
+        self.last_edit = now
+        preview = text[:MAX_CHARS_PER_REPLY_MSG]
+        try:
+            if self.sent is None:
+                self.sent = await self.message.reply(preview)
+            else:
+                await self.sent.edit(content=preview)
+        except Exception as e:
+            logger.warning(f"Streaming reply update failed: {e}")
+
+    async def finish(self, text: str):
+        if self.sent is None:
+            await self.message.reply(text)
+        else:
+            await self.sent.edit(content=text)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+simple_bot スラッシュコマンド同期のテスト
+ギルド同期に /tasks /mail /addtask が含まれるかを確認
+"""
+
+import asyncio
+import importlib
+import os
+import sys
+
+import pytest
+
+for module_name in ("discord", "pytz", "dotenv", "dacite", "yaml", "googleapiclient"):
+    pytest.importorskip(module_name)
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+EXPECTED_COMMANDS = {"tasks", "mail", "addtask"}
+
+
+@pytest.fixture
+def simple_bot(monkeypatch):
+    monkeypatch.setenv("DISCORD_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("ALLOWED_SERVER_IDS", "111,222")
+    for name in ("src.constants", "src.simple_bot"):
+        sys.modules.pop(name, None)
+    return importlib.import_module("src.simple_bot")
+
+
+def _record_syncs(monkeypatch, bot):
+    """tree.sync を差し替え、同期時点で登録されているコマンド名を記録"""
+    synced = {}
+
+    async def fake_sync(*, guild=None):
+        commands = bot.tree.get_commands(guild=guild)
+        synced[guild.id if guild else None] = {command.name for command in commands}
+        return commands
+
+    monkeypatch.setattr(bot.tree, "sync", fake_sync)
+    return synced
+
+
+def test_guild_sync_includes_slash_commands(simple_bot, monkeypatch):
+    """許可サーバーごとの同期に3コマンドが含まれる"""
+    synced = _record_syncs(monkeypatch, simple_bot)
+
+    asyncio.run(simple_bot.sync_commands())
+
+    assert synced == {111: EXPECTED_COMMANDS, 222: EXPECTED_COMMANDS}
+
+
+def test_global_sync_when_no_servers(simple_bot, monkeypatch):
+    """許可サーバー未設定ならグローバル同期にフォールバック"""
+    synced = _record_syncs(monkeypatch, simple_bot)
+    monkeypatch.setattr(simple_bot, "ALLOWED_SERVER_IDS", [])
+
+    asyncio.run(simple_bot.sync_commands())
+
+    assert synced == {None: EXPECTED_COMMANDS}